@@ -20,10 +20,50 @@ class Settings(BaseSettings):
     s3_bucket: str
     s3_region: str = "us-east-1"
     s3_public_url: str
+    # Browser-reachable S3 endpoint for presigned URLs; defaults to s3_endpoint.
+    s3_presign_endpoint: str = ""
+    # proxy: stream results through the API; presigned: redirect to a signed S3 URL
+    # (results kept after download are redirected, deletions still go through the API).
+    result_download_mode: str = "proxy"
+    result_presign_ttl_sec: int = 900
+
+    # Transient render failures are retried after base, 2*base, 4*base... seconds.
+    job_max_retries: int = 3
+    job_retry_base_sec: int = 15
+    # RQ's hard limit per attempt. Keep it above the worker's STAGE_DEADLINE_*_SEC
+    # sum, so a stage deadline fires first and the job is refunded.
+    job_timeout_sec: int = 660
+
+    # Demo jobs move to the lowest-priority queue above defer_backlog queued jobs
+    # and are rejected with 503 above reject_backlog; paid jobs are always admitted.
+    admission_demo_defer_backlog: int = 50
+    admission_demo_reject_backlog: int = 200
+    admission_retry_after_max_sec: int = 300
 
     llm_provider: str = "deepseek"
     tts_provider: str = "edge"
     voice_provider: str = "mock"
+    yandex_api_key: str = ""
+    yandex_tts_url: str = "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize"
+
+    # Shared with the worker's TTS cache; see worker TTS_CACHE_* settings. Local
+    # entries not read for idle_days expire; objects under the bucket prefix are
+    # deleted s3_expire_days after upload by a lifecycle rule (0 disables it).
+    tts_cache_dir: str = "/tmp/tts-segments"
+    tts_cache_max_mb: int = 256
+    tts_cache_idle_days: int = 30
+    tts_cache_sweep_sec: int = 60
+    tts_cache_s3_prefix: str = "tts-cache"
+    tts_cache_s3_expire_days: int = 90
+
+    preview_cache_ttl_sec: int = 86400
+    # espeak fallback previews expire quickly so a recovered provider takes over.
+    preview_fallback_ttl_sec: int = 60
+    preview_warmup_enabled: bool = True
+    preview_workers: int = 2
+    # Distinct renders allowed to wait for a worker before requests get 503.
+    preview_queue_limit: int = 8
+    preview_retry_after_sec: int = 2
 
     gigachat_auth_url: str = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
     gigachat_api_base: str = "https://gigachat.devices.sberbank.ru/api/v1"
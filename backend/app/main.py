@@ -4,6 +4,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .db import Base, engine
 from .routes import affirmations, auth, billing, health, jobs, limits, music, privacy, projects, voice, voices, webhooks
+from .services.audio_preview import start_preview_warmup
+from .services.segment_cache import ensure_shared_expiry
 from .startup_migrations import run_lightweight_migrations
 from .storage.s3 import ensure_bucket
 
@@ -23,6 +25,8 @@ def on_startup():
     Base.metadata.create_all(bind=engine)
     run_lightweight_migrations()
     ensure_bucket()
+    ensure_shared_expiry()
+    start_preview_warmup()
 
 
 app.include_router(health.router, prefix="/api")
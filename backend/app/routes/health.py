@@ -1,7 +1,14 @@
 from fastapi import APIRouter
 
+from ..services import segment_cache
+
 router = APIRouter()
 
 @router.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@router.get("/health/tts-cache")
+def tts_cache_stats():
+    return segment_cache.stats()
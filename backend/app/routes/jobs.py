@@ -1,14 +1,35 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import Response
+import json
+import uuid
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from studio_shared.billing import refund_job_purchase
 
 from .. import models, schemas
-from ..db import get_db
-from ..services.billing import consume_purchase, ensure_user_exists, validate_generation_access
-from ..storage.s3 import delete_key, download_bytes
-from ..worker_client import enqueue_audio_job
+from ..core.config import settings
+from ..db import SessionLocal, get_db
+from ..services import admission
+from ..services.billing import (
+    DEMO_DURATION_SEC,
+    MAX_TEXT_CHARS,
+    consume_purchase,
+    ensure_user_exists,
+    is_allowed_duration,
+    load_valid_purchases,
+    take_purchase,
+    validate_generation_access,
+)
+from ..services.job_events import job_event_stream
+from ..services.job_events import publish as publish_job_event
+from ..services.render_dedup import IN_FLIGHT_STATUSES, find_reusable_job, find_reusable_jobs, render_fingerprint
+from ..storage.s3 import copy_key, delete_key, object_size, presigned_url, stream_object
+from ..worker_client import cancel_queued_job, enqueue_audio_job, enqueue_audio_jobs, request_job_stop
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 FAKE_USER_ID = "demo-user"
@@ -35,16 +56,48 @@ def create_job(payload: schemas.JobCreate, db: Session = Depends(get_db)):
     if not ok:
         raise HTTPException(status_code=402, detail=reason)
 
+    fingerprint = render_fingerprint(
+        payload.affirmation_text,
+        payload.voice_mode,
+        payload.preset_voice_id,
+        payload.music_track_id,
+        payload.duration_sec,
+    )
     job = models.AudioJob(
+        id=str(uuid.uuid4()),
         project_id=payload.project_id,
         input_text=payload.affirmation_text,
         music_track_id=payload.music_track_id,
         duration_sec=payload.duration_sec,
         voice_mode=payload.voice_mode,
         preset_voice_id=payload.preset_voice_id,
-        purchase_id=purchase.id if purchase else payload.purchase_id,
+        purchase_id=purchase.id if purchase else None,
+        render_fingerprint=fingerprint,
         status="queued",
     )
+
+    needs_render = True
+    source = find_reusable_job(db, fingerprint)
+    if source and source.status == "completed":
+        result_key = f"results/{job.id}.mp3"
+        if copy_key(source.result_s3_key, result_key):
+            job.status = "completed"
+            job.result_s3_key = result_key
+            needs_render = False
+    elif source:
+        # Same render already queued or running: the worker copies its result to us.
+        job.dedup_of_job_id = source.id
+        needs_render = False
+
+    # Only jobs that add a render to the queue go through admission.
+    ticket = admission.admit(payload.duration_sec) if needs_render else None
+    if ticket and ticket.rejected:
+        raise HTTPException(
+            status_code=503,
+            detail="Demo queue is full, try again later",
+            headers={"Retry-After": str(ticket.retry_after_sec)},
+        )
+
     db.add(job)
     db.commit()
     db.refresh(job)
@@ -52,10 +105,169 @@ def create_job(payload: schemas.JobCreate, db: Session = Depends(get_db)):
     if purchase:
         consume_purchase(db, purchase)
 
-    enqueue_audio_job(job.id)
+    if needs_render:
+        enqueue_audio_job(job.id, ticket.queue_name)
+        return schemas.JobOut(id=job.id, status=job.status, estimated_wait_sec=ticket.estimated_wait_sec)
+    if job.dedup_of_job_id:
+        _settle_followers(db, [job])
+        db.refresh(job)
     return schemas.JobOut(id=job.id, status=job.status)
 
 
+def _batch_item_error(item: schemas.JobCreate, known_projects: set[str]) -> tuple[int, str] | None:
+    # Same checks and messages as create_job, without the per-item queries.
+    if item.project_id not in known_projects:
+        return 404, "Project not found"
+    if item.voice_mode not in {"my_voice", "system_voice"}:
+        return 400, "Unsupported voice mode"
+    if len(item.affirmation_text) > MAX_TEXT_CHARS:
+        return 402, "Text is too long"
+    if not is_allowed_duration(item.duration_sec):
+        return 402, "Unsupported duration"
+    return None
+
+
+@router.post("/batch", response_model=schemas.JobBatchOut)
+def create_jobs_batch(payload: schemas.JobBatchCreate, db: Session = Depends(get_db)):
+    # Projects, purchases and reusable renders are loaded once for the whole batch;
+    # jobs go in with one INSERT and onto the queue through one Redis pipeline.
+    ensure_user_exists(db, FAKE_USER_ID)
+
+    project_ids = {item.project_id for item in payload.jobs}
+    known_projects = {
+        row.id for row in db.query(models.Project.id).filter(models.Project.id.in_(project_ids))
+    }
+    purchases = load_valid_purchases(db, FAKE_USER_ID)
+    fingerprints = [
+        render_fingerprint(
+            item.affirmation_text,
+            item.voice_mode,
+            item.preset_voice_id,
+            item.music_track_id,
+            item.duration_sec,
+        )
+        for item in payload.jobs
+    ]
+    reusable = find_reusable_jobs(db, fingerprints)
+    backlog = admission.load_backlog()
+
+    items: list[schemas.JobBatchItemOut] = []
+    rows = []
+    consumed_ids = []
+    to_enqueue: dict[str, list[str]] = {}
+    batch_leaders: dict[str, str] = {}
+    now = datetime.utcnow()
+
+    for index, (item, fingerprint) in enumerate(zip(payload.jobs, fingerprints)):
+        error = _batch_item_error(item, known_projects)
+        purchase = None
+        if not error and item.duration_sec != DEMO_DURATION_SEC:
+            purchase = take_purchase(purchases, item.duration_sec, item.purchase_id)
+            if not purchase:
+                error = (402, "Payment required for selected duration")
+        if error:
+            items.append(schemas.JobBatchItemOut(index=index, ok=False, status_code=error[0], error=error[1]))
+            continue
+
+        job_id = str(uuid.uuid4())
+        row = {
+            "id": job_id,
+            "project_id": item.project_id,
+            "input_text": item.affirmation_text,
+            "music_track_id": item.music_track_id,
+            "duration_sec": item.duration_sec,
+            "voice_mode": item.voice_mode,
+            "preset_voice_id": item.preset_voice_id,
+            "purchase_id": purchase.id if purchase else None,
+            "render_fingerprint": fingerprint,
+            "status": "queued",
+            "result_s3_key": None,
+            "dedup_of_job_id": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        source = reusable.get(fingerprint)
+        result_key = f"results/{job_id}.mp3"
+        ticket = None
+        if source and source.status == "completed" and copy_key(source.result_s3_key, result_key):
+            row["status"] = "completed"
+            row["result_s3_key"] = result_key
+        elif source and source.status != "completed":
+            row["dedup_of_job_id"] = source.id
+        elif fingerprint in batch_leaders:
+            # Identical items within the batch render once and share the result.
+            row["dedup_of_job_id"] = batch_leaders[fingerprint]
+        else:
+            ticket = admission.admit(item.duration_sec, bulk=True, backlog=backlog)
+            if ticket.rejected:
+                items.append(
+                    schemas.JobBatchItemOut(index=index, ok=False, status_code=503, error="Demo queue is full, try again later")
+                )
+                continue
+            batch_leaders[fingerprint] = job_id
+            to_enqueue.setdefault(ticket.queue_name, []).append(job_id)
+
+        rows.append(row)
+        if purchase:
+            consumed_ids.append(purchase.id)
+        wait = ticket.estimated_wait_sec if ticket else None
+        job_out = schemas.JobOut(id=job_id, status=row["status"], estimated_wait_sec=wait)
+        items.append(schemas.JobBatchItemOut(index=index, ok=True, job=job_out))
+
+    if rows:
+        db.execute(insert(models.AudioJob), rows)
+    if consumed_ids:
+        db.execute(
+            update(models.Purchase)
+            .where(models.Purchase.id.in_(consumed_ids))
+            .values(consumed=True, consumed_at=now)
+        )
+    db.commit()
+
+    enqueue_audio_jobs(to_enqueue)
+    batch_ids = set(batch_leaders.values())
+    late = [row["id"] for row in rows if row["dedup_of_job_id"] and row["dedup_of_job_id"] not in batch_ids]
+    if late:
+        _settle_followers(db, db.query(models.AudioJob).filter(models.AudioJob.id.in_(late)).all())
+    return schemas.JobBatchOut(items=items, created=len(rows), failed=len(items) - len(rows))
+
+
+def _settle_followers(db: Session, followers: list[models.AudioJob]):
+    # The leader's worker hands its result to queued followers when it finishes,
+    # or queues them on their own when it fails. A follower committed after that
+    # (or whose leader the API cancelled) would wait forever, so the request that
+    # created or cancelled it settles it here. GET stays read-only.
+    leader_ids = {follower.dedup_of_job_id for follower in followers if follower.dedup_of_job_id}
+    if not leader_ids:
+        return
+    leaders = {leader.id: leader for leader in db.query(models.AudioJob).filter(models.AudioJob.id.in_(leader_ids))}
+    to_enqueue: dict[str, list[str]] = {}
+    for follower in followers:
+        leader = leaders.get(follower.dedup_of_job_id)
+        if leader and leader.status in IN_FLIGHT_STATUSES:
+            continue
+        result_key = f"results/{follower.id}.mp3"
+        if leader and leader.status == "completed" and leader.result_s3_key and copy_key(leader.result_s3_key, result_key):
+            values = {"status": "completed", "result_s3_key": result_key}
+        else:
+            values = {"dedup_of_job_id": None}
+        # Conditional, in case the leader's worker got to this follower first.
+        claimed = (
+            db.query(models.AudioJob)
+            .filter(
+                models.AudioJob.id == follower.id,
+                models.AudioJob.dedup_of_job_id == follower.dedup_of_job_id,
+                models.AudioJob.status == "queued",
+            )
+            .update({**values, "updated_at": datetime.utcnow()}, synchronize_session=False)
+        )
+        if claimed and "status" not in values:
+            to_enqueue.setdefault(admission.queue_for(follower.duration_sec), []).append(follower.id)
+    db.commit()
+    enqueue_audio_jobs(to_enqueue)
+
+
 @router.get("/{job_id}", response_model=schemas.JobOut)
 def get_job(job_id: str, db: Session = Depends(get_db)):
     job = db.query(models.AudioJob).filter(models.AudioJob.id == job_id).first()
@@ -66,9 +278,111 @@ def get_job(job_id: str, db: Session = Depends(get_db)):
     return schemas.JobOut(id=job.id, status=job.status, result_url=result_url, error=job.error)
 
 
+@router.delete("/{job_id}", response_model=schemas.JobOut)
+def cancel_job(job_id: str, response: Response, db: Session = Depends(get_db)):
+    job = db.query(models.AudioJob).filter(models.AudioJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in {"completed", "failed", "cancelled"}:
+        raise HTTPException(status_code=409, detail="Job already finished")
+
+    # The flag covers a worker that picks the job up right now; it checks it
+    # before every stage. Until then the row decides: only a job still queued
+    # is cancelled here, a running one is stopped and refunded by the worker.
+    request_job_stop(job.id)
+    cancelled = (
+        db.query(models.AudioJob)
+        .filter(models.AudioJob.id == job.id, models.AudioJob.status == "queued")
+        .update(
+            {"status": "cancelled", "error": "Cancelled", "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    if not cancelled:
+        db.rollback()
+        response.status_code = 202
+        return schemas.JobOut(id=job.id, status="cancelling")
+
+    refund_job_purchase(db, job.purchase_id, job.project_id, job.duration_sec)
+    db.commit()
+    cancel_queued_job(job.id)
+    publish_job_event(job.id, "cancelled", error="Cancelled")
+    followers = (
+        db.query(models.AudioJob)
+        .filter(models.AudioJob.dedup_of_job_id == job.id, models.AudioJob.status == "queued")
+        .all()
+    )
+    _settle_followers(db, followers)
+    return schemas.JobOut(id=job.id, status="cancelled", error="Cancelled")
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    # Server-Sent Events: one DB read on connect, then worker events from Redis pub/sub.
+    async def stream():
+        yield "retry: 3000\n\n"
+        async for event in job_event_stream(job_id):
+            if await request.is_disconnected():
+                return
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: status\ndata: {json.dumps(event)}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+
+@router.websocket("/{job_id}/ws")
+async def job_events_ws(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    try:
+        async for event in job_event_stream(job_id):
+            if event is not None:
+                await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    # Single "bytes=" range as inclusive (start, end); None means serve the whole file.
+    # Multi-range requests are answered with the whole file, which RFC 9110 allows.
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_raw, _, end_raw = header[6:].strip().partition("-")
+    try:
+        if not start_raw:
+            suffix = int(end_raw)
+            if suffix <= 0:
+                raise ValueError
+            return max(0, size - suffix), size - 1
+        start = int(start_raw)
+        end = min(int(end_raw), size - 1) if end_raw else size - 1
+    except ValueError:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _delete_result(job_id: str, key: str):
+    # Runs after the body is sent, with its own session; the request's one is already closed.
+    delete_key(key)
+    db = SessionLocal()
+    try:
+        job = db.query(models.AudioJob).filter(models.AudioJob.id == job_id).first()
+        if job and job.result_s3_key == key:
+            job.result_s3_key = None
+            db.commit()
+    finally:
+        db.close()
+
+
 @router.get("/{job_id}/result")
 def download_job_result(
     job_id: str,
+    request: Request,
     delete_after_download: bool = Query(True),
     db: Session = Depends(get_db),
 ):
@@ -76,16 +390,37 @@ def download_job_result(
     if not job or not job.result_s3_key:
         raise HTTPException(status_code=404, detail="Result file not found")
 
-    data = download_bytes(job.result_s3_key)
-    if not data:
-        raise HTTPException(status_code=404, detail="Result file is empty")
+    filename = f"affirmation-{job.id}.mp3"
+    if settings.result_download_mode == "presigned" and not delete_after_download:
+        url = presigned_url(job.result_s3_key, settings.result_presign_ttl_sec, filename=filename)
+        return RedirectResponse(url, status_code=307)
 
-    headers = {"Content-Disposition": f'attachment; filename="affirmation-{job.id}.mp3"'}
-    response = Response(content=data, media_type="audio/mpeg", headers=headers)
+    size = object_size(job.result_s3_key)
+    if not size:
+        raise HTTPException(status_code=404, detail="Result file is empty")
 
-    if delete_after_download:
-        delete_key(job.result_s3_key)
-        job.result_s3_key = None
-        db.commit()
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Accept-Ranges": "bytes",
+    }
+    byte_range = _parse_range(request.headers.get("range"), size)
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            stream_object(job.result_s3_key, start, end),
+            status_code=206,
+            media_type="audio/mpeg",
+            headers=headers,
+        )
 
-    return response
+    # Only a complete download consumes the result; range requests come from players seeking.
+    headers["Content-Length"] = str(size)
+    background = BackgroundTask(_delete_result, job.id, job.result_s3_key) if delete_after_download else None
+    return StreamingResponse(
+        stream_object(job.result_s3_key),
+        media_type="audio/mpeg",
+        headers=headers,
+        background=background,
+    )
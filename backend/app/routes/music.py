@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Query, Request
 
-from ..services.audio_preview import generate_music_preview_mp3
+from ..core.config import settings
+from ..services.audio_preview import PreviewBusy, music_preview_async
+from ..utils.http_cache import cached_response
 
 router = APIRouter(prefix="/music", tags=["music"])
 
@@ -55,6 +56,13 @@ def list_music():
 
 
 @router.get("/{track_id}/preview")
-def music_preview(track_id: str, duration_sec: int = Query(10, ge=4, le=25)):
-    data = generate_music_preview_mp3(track_id, duration_sec=duration_sec)
-    return Response(content=data, media_type="audio/mpeg")
+async def music_preview(request: Request, track_id: str, duration_sec: int = Query(10, ge=4, le=25)):
+    try:
+        artifact = await music_preview_async(track_id, duration_sec=duration_sec)
+    except PreviewBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Preview is busy, retry shortly",
+            headers={"Retry-After": str(settings.preview_retry_after_sec)},
+        )
+    return cached_response(request, artifact.data, artifact.etag, artifact.max_age, "audio/mpeg")
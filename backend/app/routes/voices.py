@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Query
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Query, Request
 
-from ..services.audio_preview import generate_voice_preview_mp3
+from ..core.config import settings
+from ..services.audio_preview import PreviewBusy, voice_preview_async
+from ..utils.http_cache import cached_response
 
 router = APIRouter(prefix="/voices", tags=["voices"])
 
@@ -65,6 +66,13 @@ def list_voices():
 
 
 @router.get("/{voice_id}/preview")
-def voice_preview(voice_id: str, lang: str = Query("ru", pattern="^(ru|en)$")):
-    data = generate_voice_preview_mp3(voice_id, language=lang)
-    return Response(content=data, media_type="audio/mpeg")
+async def voice_preview(request: Request, voice_id: str, lang: str = Query("ru", pattern="^(ru|en)$")):
+    try:
+        artifact = await voice_preview_async(voice_id, language=lang)
+    except PreviewBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Preview is busy, retry shortly",
+            headers={"Retry-After": str(settings.preview_retry_after_sec)},
+        )
+    return cached_response(request, artifact.data, artifact.etag, artifact.max_age, "audio/mpeg")
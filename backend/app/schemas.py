@@ -55,6 +55,26 @@ class JobOut(BaseModel):
     status: str
     result_url: Optional[str] = None
     error: Optional[str] = None
+    # Expected seconds in the queue before rendering starts; set when a job is enqueued.
+    estimated_wait_sec: Optional[float] = None
+
+
+class JobBatchCreate(BaseModel):
+    jobs: List[JobCreate] = Field(min_length=1, max_length=100)
+
+
+class JobBatchItemOut(BaseModel):
+    index: int
+    ok: bool
+    job: Optional[JobOut] = None
+    status_code: int = 200
+    error: Optional[str] = None
+
+
+class JobBatchOut(BaseModel):
+    items: List[JobBatchItemOut]
+    created: int
+    failed: int
 
 
 class BillingPackageOut(BaseModel):
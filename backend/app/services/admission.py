@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Optional
+
+import redis
+from rq import Queue, Worker
+from studio_shared.queues import DEMO, DEMO_BULK, LEGACY, PAID, PAID_BULK, QUEUE_WEIGHTS, TIMINGS_KEY  # noqa: F401
+
+from ..core.config import settings
+from ..worker_client import redis_conn
+from .billing import DEMO_DURATION_SEC
+
+# Queue layout from studio_shared.queues: paid jobs ahead of demos,
+# interactive submissions ahead of batches, weighted rather than strict so lower
+# queues keep moving. The wait estimate reads queue depths, the worker count and
+# recent per-class stage timings in one pipeline; when Redis is unreachable jobs
+# are admitted without an estimate.
+
+# Used until the worker has recorded timings for a class.
+DEFAULT_JOB_SEC = {"demo": 20.0, "paid": 90.0}
+
+
+@dataclass
+class Backlog:
+    depths: dict[str, int] = field(default_factory=dict)
+    job_sec: dict[str, float] = field(default_factory=dict)
+    workers: int = 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.depths.values())
+
+
+@dataclass
+class Admission:
+    queue_name: str
+    estimated_wait_sec: Optional[float] = None
+    rejected: bool = False
+    retry_after_sec: int = 0
+
+
+def job_class(duration_sec: int) -> str:
+    return "demo" if duration_sec == DEMO_DURATION_SEC else "paid"
+
+
+def queue_for(duration_sec: int, bulk: bool = False) -> str:
+    if job_class(duration_sec) == "demo":
+        return DEMO_BULK if bulk else DEMO
+    return PAID_BULK if bulk else PAID
+
+
+def _queue_class(queue_name: str) -> str:
+    return "demo" if queue_name in (DEMO, DEMO_BULK) else "paid"
+
+
+def _mean_job_sec(raw_timings: list[bytes], default: float) -> float:
+    totals = []
+    for raw in raw_timings:
+        try:
+            timing = json.loads(raw)
+            totals.append(float(timing.get("tts", 0.0)) + float(timing.get("render", 0.0)))
+        except (ValueError, TypeError, AttributeError):
+            continue
+    return sum(totals) / len(totals) if totals else default
+
+
+def load_backlog() -> Optional[Backlog]:
+    names = list(QUEUE_WEIGHTS)
+    classes = list(DEFAULT_JOB_SEC)
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for name in names:
+            pipe.llen(Queue(name, connection=redis_conn).key)
+        for cls in classes:
+            pipe.lrange(TIMINGS_KEY.format(job_class=cls), 0, -1)
+        pipe.scard(Worker.redis_workers_keys)
+        results = pipe.execute()
+    except redis.RedisError:
+        return None
+
+    depths = dict(zip(names, (int(value or 0) for value in results[: len(names)])))
+    timings = results[len(names) : len(names) + len(classes)]
+    job_sec = {cls: _mean_job_sec(raw or [], DEFAULT_JOB_SEC[cls]) for cls, raw in zip(classes, timings)}
+    return Backlog(depths=depths, job_sec=job_sec, workers=max(1, int(results[-1] or 0)))
+
+
+def estimate_wait(backlog: Backlog, queue_name: str) -> float:
+    # Everything in the job's own queue runs first; other queues count in
+    # proportion to how often they win the weighted draw against it.
+    weight = QUEUE_WEIGHTS[queue_name]
+    ahead = 0.0
+    for name, depth in backlog.depths.items():
+        share = 1.0 if name == queue_name else min(1.0, QUEUE_WEIGHTS[name] / weight)
+        ahead += depth * share * backlog.job_sec[_queue_class(name)]
+    return round(ahead / backlog.workers, 1)
+
+
+def admit(duration_sec: int, bulk: bool = False, backlog: Optional[Backlog] = None) -> Admission:
+    demo = job_class(duration_sec) == "demo"
+    queue_name = queue_for(duration_sec, bulk)
+
+    if backlog is None:
+        backlog = load_backlog()
+    if backlog is None:
+        return Admission(queue_name=queue_name)
+
+    # Demos are deferred to the lowest queue once the backlog builds up, and
+    # turned away beyond the hard limit; paid jobs are always accepted.
+    if demo and backlog.total >= settings.admission_demo_reject_backlog:
+        wait = estimate_wait(backlog, DEMO_BULK)
+        retry_after = min(max(1, math.ceil(wait)), settings.admission_retry_after_max_sec)
+        return Admission(queue_name=DEMO_BULK, estimated_wait_sec=wait, rejected=True, retry_after_sec=retry_after)
+    if demo and backlog.total >= settings.admission_demo_defer_backlog:
+        queue_name = DEMO_BULK
+
+    wait = estimate_wait(backlog, queue_name)
+    # Later items of the same batch queue behind this one.
+    backlog.depths[queue_name] = backlog.depths.get(queue_name, 0) + 1
+    return Admission(queue_name=queue_name, estimated_wait_sec=wait)
@@ -1,15 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import os
 import shutil
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 
-import edge_tts
 import httpx
+from studio_shared import edge_client
 
 from ..core.config import settings
+from . import segment_cache
 
 
 VOICE_PRESETS = {
@@ -74,11 +80,6 @@ def _voice_text(language: str) -> str:
     return "I am calm and confident. I have clear focus and inner stability every day."
 
 
-async def _edge_save_to_file(text: str, voice_name: str, rate: str, pitch: str, path: str):
-    communicate = edge_tts.Communicate(text=text, voice=voice_name, rate=rate, pitch=pitch)
-    await communicate.save(path)
-
-
 def _yandex_preview(text: str, voice_name: str) -> bytes:
     if not settings.yandex_api_key:
         raise RuntimeError("YANDEX_API_KEY is not configured")
@@ -150,10 +151,29 @@ def _build_generated_music(track_id: str, duration_sec: int, out_path: str):
     )
 
 
-def generate_voice_preview_mp3(voice_id: str, language: str = "ru") -> bytes:
+def _preview_cache_keys(preset: dict, text: str) -> dict[str, str]:
+    # Same parameters the worker keys on, so previews and job segments share cache entries.
+    keys = {}
+    if settings.yandex_api_key:
+        params = {"voice": preset.get("yandex", "jane"), "lang": "ru-RU", "format": "mp3"}
+        keys["yandex"] = segment_cache.segment_key("yandex", params, text)
+    keys["edge"] = segment_cache.segment_key("edge", preset.get("edge"), text)
+    return keys
+
+
+def _render_voice_preview(voice_id: str, language: str) -> tuple[bytes, bool]:
+    # Returns (mp3, is_fallback); the espeak fallback is flagged so it is cached only briefly.
     preset = VOICE_PRESETS.get(voice_id, VOICE_PRESETS["jane"])
     espeak_bin = _pick_espeak()
     ffmpeg = _ffmpeg()
+    text = _voice_text(language)
+
+    cache_keys = _preview_cache_keys(preset, text)
+    # Only the provider tried first below, so an edge preview cached while Yandex
+    # was failing does not keep standing in for it.
+    cached = segment_cache.lookup([next(iter(cache_keys.values()))])
+    if cached:
+        return cached, False
 
     with tempfile.TemporaryDirectory(prefix="voice-preview-") as tmp:
         wav_path = os.path.join(tmp, "preview.wav")
@@ -162,20 +182,18 @@ def generate_voice_preview_mp3(voice_id: str, language: str = "ru") -> bytes:
         try:
             # 1) Best quality for RU/CIS if user provided Yandex key.
             if settings.yandex_api_key:
-                data = _yandex_preview(_voice_text(language), preset.get("yandex", "jane"))
-                with open(mp3_path, "wb") as f:
-                    f.write(data)
-                with open(mp3_path, "rb") as f:
-                    return f.read()
+                data = _yandex_preview(text, preset.get("yandex", "jane"))
+                segment_cache.put(cache_keys["yandex"], data)
+                return data, False
 
             # 2) Free fallback.
             edge_cfg = preset.get("edge", {})
             voice_name = edge_cfg.get("voice", "ru-RU-SvetlanaNeural")
             rate = edge_cfg.get("rate", "+0%")
             pitch = edge_cfg.get("pitch", "+0Hz")
-            asyncio.run(_edge_save_to_file(_voice_text(language), voice_name, rate, pitch, mp3_path))
-            with open(mp3_path, "rb") as f:
-                return f.read()
+            data = edge_client.synthesize(text, voice_name, rate, pitch, timeout=25.0)
+            segment_cache.put(cache_keys["edge"], data)
+            return data, False
         except Exception:
             # 3) Last fallback to local TTS.
             espeak_cfg = preset.get("espeak", {"voice": "ru+f2", "speed": 145, "pitch": 50})
@@ -190,12 +208,16 @@ def generate_voice_preview_mp3(voice_id: str, language: str = "ru") -> bytes:
                     str(espeak_cfg["pitch"]),
                     "-w",
                     wav_path,
-                    _voice_text(language),
+                    text,
                 ]
             )
             _trim_to_preview(wav_path, mp3_path, duration_sec=8)
             with open(mp3_path, "rb") as f:
-                return f.read()
+                return f.read(), True
+
+
+def generate_voice_preview_mp3(voice_id: str, language: str = "ru") -> bytes:
+    return _render_voice_preview(voice_id, language)[0]
 
 
 def generate_music_preview_mp3(track_id: str, duration_sec: int = 10) -> bytes:
@@ -204,3 +226,153 @@ def generate_music_preview_mp3(track_id: str, duration_sec: int = 10) -> bytes:
         _build_generated_music(track_id=track_id, duration_sec=max(4, int(duration_sec)), out_path=mp3_path)
         with open(mp3_path, "rb") as f:
             return f.read()
+
+
+# Rendered previews are kept in process memory: the whole catalogue is 6 voices x 2
+# languages plus 4 tracks x the allowed durations, a few MB in total.
+
+
+@dataclass(frozen=True)
+class PreviewArtifact:
+    data: bytes
+    etag: str
+    max_age: int
+    expires_at: float
+
+
+_artifacts: dict[tuple, PreviewArtifact] = {}
+_artifacts_lock = threading.Lock()
+
+
+def _artifact(data: bytes, ttl_sec: int) -> PreviewArtifact:
+    etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+    return PreviewArtifact(data=data, etag=etag, max_age=ttl_sec, expires_at=time.monotonic() + ttl_sec)
+
+
+def _cached_artifact(key: tuple) -> PreviewArtifact | None:
+    with _artifacts_lock:
+        artifact = _artifacts.get(key)
+    if artifact and artifact.expires_at > time.monotonic():
+        return artifact
+    return None
+
+
+def _store_artifact(key: tuple, artifact: PreviewArtifact) -> PreviewArtifact:
+    with _artifacts_lock:
+        _artifacts[key] = artifact
+    return artifact
+
+
+def _voice_key(voice_id: str, language: str) -> tuple:
+    # Unknown voice ids render the default preset, so they share its entry.
+    return ("voice", voice_id if voice_id in VOICE_PRESETS else "jane", language)
+
+
+def _music_key(track_id: str, duration_sec: int) -> tuple:
+    return ("music", track_id if track_id in MUSIC_FILTERS else "calm-1", max(4, int(duration_sec)))
+
+
+def voice_preview(voice_id: str, language: str = "ru") -> PreviewArtifact:
+    key = _voice_key(voice_id, language)
+    voice_id = key[1]
+    artifact = _cached_artifact(key)
+    if artifact:
+        return artifact
+    data, fallback = _render_voice_preview(voice_id, language)
+    ttl = settings.preview_fallback_ttl_sec if fallback else settings.preview_cache_ttl_sec
+    return _store_artifact(key, _artifact(data, ttl))
+
+
+def music_preview(track_id: str, duration_sec: int = 10) -> PreviewArtifact:
+    key = _music_key(track_id, duration_sec)
+    _, track_id, duration_sec = key
+    artifact = _cached_artifact(key)
+    if artifact:
+        return artifact
+    data = generate_music_preview_mp3(track_id, duration_sec=duration_sec)
+    return _store_artifact(key, _artifact(data, settings.preview_cache_ttl_sec))
+
+
+# Renders run on a small dedicated pool, never on the server's request threads.
+# Concurrent requests for the same artifact share one render, and once
+# preview_workers + preview_queue_limit distinct renders are pending, new ones
+# are refused with PreviewBusy rather than queued.
+
+
+class PreviewBusy(RuntimeError):
+    pass
+
+
+_executor: ThreadPoolExecutor | None = None
+_inflight: dict[tuple, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _preview_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _inflight_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, settings.preview_workers), thread_name_prefix="preview")
+        return _executor
+
+
+def _submit(key: tuple, fn, *args) -> Future:
+    executor = _preview_executor()
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        if len(_inflight) >= max(1, settings.preview_workers) + max(0, settings.preview_queue_limit):
+            raise PreviewBusy("Preview renderer is busy")
+        future = executor.submit(fn, *args)
+        _inflight[key] = future
+
+    def _release(_):
+        with _inflight_lock:
+            if _inflight.get(key) is future:
+                del _inflight[key]
+
+    future.add_done_callback(_release)
+    return future
+
+
+async def _await_shared(future: Future) -> PreviewArtifact:
+    # Shielded: a disconnecting client must not cancel a render other requests are waiting on.
+    return await asyncio.shield(asyncio.wrap_future(future))
+
+
+async def voice_preview_async(voice_id: str, language: str = "ru") -> PreviewArtifact:
+    key = _voice_key(voice_id, language)
+    artifact = _cached_artifact(key)
+    if artifact:
+        return artifact
+    return await _await_shared(_submit(key, voice_preview, voice_id, language))
+
+
+async def music_preview_async(track_id: str, duration_sec: int = 10) -> PreviewArtifact:
+    key = _music_key(track_id, duration_sec)
+    artifact = _cached_artifact(key)
+    if artifact:
+        return artifact
+    return await _await_shared(_submit(key, music_preview, track_id, duration_sec))
+
+
+def warm_previews():
+    # Music first: local and fast. Voices may need a provider round trip each.
+    # Goes through the render pool so a request for the same preview joins the warm-up render.
+    jobs = [(_music_key(track_id, 10), music_preview, track_id) for track_id in MUSIC_FILTERS]
+    for voice_id in VOICE_PRESETS:
+        for language in ("ru", "en"):
+            jobs.append((_voice_key(voice_id, language), voice_preview, voice_id, language))
+    for key, fn, *args in jobs:
+        if _cached_artifact(key):
+            continue
+        try:
+            _submit(key, fn, *args).result()
+        except Exception:
+            pass
+
+
+def start_preview_warmup():
+    if settings.preview_warmup_enabled:
+        threading.Thread(target=warm_previews, name="preview-warmup", daemon=True).start()
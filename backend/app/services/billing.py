@@ -120,6 +120,31 @@ def _find_valid_purchase(
     return query.order_by(models.Purchase.created_at.desc()).first()
 
 
+def load_valid_purchases(db: Session, user_id: str) -> list[models.Purchase]:
+    # Every paid, unconsumed purchase of the user, newest first; batch validation picks from this list.
+    return (
+        db.query(models.Purchase)
+        .filter(models.Purchase.user_id == user_id)
+        .filter(models.Purchase.status == "paid")
+        .filter(models.Purchase.consumed == False)
+        .order_by(models.Purchase.created_at.desc())
+        .all()
+    )
+
+
+def take_purchase(
+    purchases: list[models.Purchase],
+    duration_sec: int,
+    purchase_id: Optional[str],
+) -> Optional[models.Purchase]:
+    # Same choice as _find_valid_purchase, over a preloaded list; the match is removed so it is used once.
+    for index, purchase in enumerate(purchases):
+        if purchase.duration_sec != duration_sec or (purchase_id and purchase.id != purchase_id):
+            continue
+        return purchases.pop(index)
+    return None
+
+
 def validate_generation_access(
     db: Session,
     user_id: str,
@@ -149,3 +174,4 @@ def consume_purchase(db: Session, purchase: models.Purchase):
     purchase.consumed = True
     purchase.consumed_at = datetime.utcnow()
     db.commit()
+
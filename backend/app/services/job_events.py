@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+
+import redis
+import redis.asyncio as aioredis
+from fastapi.concurrency import run_in_threadpool
+
+from .. import models
+from ..core.config import settings
+from ..db import SessionLocal
+from ..worker_client import redis_conn
+
+# Must match worker/events.py.
+CHANNEL_PREFIX = "jobs:events:"
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "not_found"}
+
+_async_redis: Optional[aioredis.Redis] = None
+
+
+def _redis() -> aioredis.Redis:
+    global _async_redis
+    if _async_redis is None:
+        _async_redis = aioredis.from_url(settings.redis_url)
+    return _async_redis
+
+
+def channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+
+def publish(job_id: str, status: str, error: Optional[str] = None):
+    # For status changes made by the API itself; same payload as the worker's events.
+    payload = {"job_id": job_id, "status": status, "stage": None, "progress": None, "error": error, "ts": time.time()}
+    try:
+        redis_conn.publish(channel(job_id), json.dumps(payload))
+    except redis.RedisError:
+        pass
+
+
+def _result_url(job_id: str, status: str, has_result: bool) -> Optional[str]:
+    return f"/api/jobs/{job_id}/result" if status == "completed" and has_result else None
+
+
+def _snapshot(job_id: str) -> dict:
+    db = SessionLocal()
+    try:
+        job = db.query(models.AudioJob).filter(models.AudioJob.id == job_id).first()
+        if not job:
+            return {"id": job_id, "status": "not_found", "stage": None, "progress": None, "error": None, "result_url": None}
+        return {
+            "id": job.id,
+            "status": job.status,
+            "stage": None,
+            "progress": 1.0 if job.status == "completed" else None,
+            "error": job.error,
+            "result_url": _result_url(job.id, job.status, bool(job.result_s3_key)),
+            "dedup_of_job_id": job.dedup_of_job_id,
+        }
+    finally:
+        db.close()
+
+
+def _from_worker(job_id: str, payload: dict) -> dict:
+    status = payload.get("status") or "processing"
+    return {
+        "id": job_id,
+        "status": status,
+        "stage": payload.get("stage"),
+        "progress": payload.get("progress"),
+        "error": payload.get("error"),
+        "result_url": _result_url(job_id, status, True),
+    }
+
+
+async def job_event_stream(job_id: str, keepalive_sec: float = 15.0) -> AsyncIterator[Optional[dict]]:
+    # Subscribe before reading the database so nothing published in between is
+    # lost. Yields status dicts and None as a keepalive tick; stops after a
+    # terminal status. A follower of a deduplicated render also listens on its
+    # leader's channel and re-reads its own row when the leader finishes.
+    # Without Redis the stream is just the snapshot; clients reconnect.
+    pubsub = _redis().pubsub()
+    try:
+        try:
+            await pubsub.subscribe(channel(job_id))
+        except redis.RedisError:
+            snapshot = await run_in_threadpool(_snapshot, job_id)
+            snapshot.pop("dedup_of_job_id", None)
+            yield snapshot
+            return
+
+        snapshot = await run_in_threadpool(_snapshot, job_id)
+        leader_id = snapshot.pop("dedup_of_job_id", None)
+        if leader_id:
+            await pubsub.subscribe(channel(leader_id))
+        yield snapshot
+        if snapshot["status"] in TERMINAL_STATUSES:
+            return
+
+        while True:
+            try:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=keepalive_sec)
+            except redis.RedisError:
+                return
+            if message is None:
+                yield None
+                continue
+            try:
+                payload = json.loads(message["data"])
+            except (TypeError, ValueError):
+                continue
+
+            if payload.get("job_id") == job_id:
+                event = _from_worker(job_id, payload)
+            elif payload.get("status") in TERMINAL_STATUSES:
+                event = await run_in_threadpool(_snapshot, job_id)
+                event.pop("dedup_of_job_id", None)
+            else:
+                continue
+            yield event
+            if event["status"] in TERMINAL_STATUSES:
+                return
+    finally:
+        try:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+        except (redis.RedisError, asyncio.CancelledError, OSError):
+            pass
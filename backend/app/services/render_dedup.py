@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from studio_shared.render_version import RENDER_VERSION
+
+from .. import models
+
+DEFAULT_SYSTEM_VOICE = "jane"
+IN_FLIGHT_STATUSES = ("queued", "processing")
+
+
+def _normalize_text(text: str) -> str:
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _voice_key(voice_mode: str, preset_voice_id: Optional[str]) -> str:
+    if voice_mode == "system_voice":
+        return f"system:{preset_voice_id or DEFAULT_SYSTEM_VOICE}"
+    return voice_mode
+
+
+def render_fingerprint(
+    text: str,
+    voice_mode: str,
+    preset_voice_id: Optional[str],
+    music_track_id: str,
+    duration_sec: int,
+) -> str:
+    payload = {
+        "v": RENDER_VERSION,
+        "text": _normalize_text(text),
+        "voice": _voice_key(voice_mode, preset_voice_id),
+        "music": music_track_id,
+        "duration": int(duration_sec),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def find_reusable_job(db: Session, fingerprint: str) -> Optional[models.AudioJob]:
+    # A finished artifact wins over an in-flight render; followers are never leaders.
+    candidates = (
+        db.query(models.AudioJob)
+        .filter(models.AudioJob.render_fingerprint == fingerprint)
+        .filter(models.AudioJob.dedup_of_job_id.is_(None))
+        .filter(
+            or_(
+                (models.AudioJob.status == "completed") & models.AudioJob.result_s3_key.isnot(None),
+                models.AudioJob.status.in_(IN_FLIGHT_STATUSES),
+            )
+        )
+        .order_by(models.AudioJob.created_at.desc())
+        .all()
+    )
+    for job in candidates:
+        if job.status == "completed":
+            return job
+    return candidates[0] if candidates else None
+
+
+def find_reusable_jobs(db: Session, fingerprints: list[str]) -> dict[str, models.AudioJob]:
+    # find_reusable_job for many fingerprints in one query.
+    if not fingerprints:
+        return {}
+    candidates = (
+        db.query(models.AudioJob)
+        .filter(models.AudioJob.render_fingerprint.in_(set(fingerprints)))
+        .filter(models.AudioJob.dedup_of_job_id.is_(None))
+        .filter(
+            or_(
+                (models.AudioJob.status == "completed") & models.AudioJob.result_s3_key.isnot(None),
+                models.AudioJob.status.in_(IN_FLIGHT_STATUSES),
+            )
+        )
+        .order_by(models.AudioJob.created_at.desc())
+        .all()
+    )
+    found: dict[str, models.AudioJob] = {}
+    for job in candidates:
+        current = found.get(job.render_fingerprint)
+        if current is None or (job.status == "completed" and current.status != "completed"):
+            found[job.render_fingerprint] = job
+    return found
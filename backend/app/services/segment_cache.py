@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from studio_shared.segment_cache import SegmentCache
+from studio_shared.segment_keys import segment_key  # noqa: F401  re-exported for previews
+
+from ..core.config import settings
+from ..storage.s3 import download_bytes, ensure_expiry_rule, upload_bytes
+from ..worker_client import redis_conn
+
+# The worker's TTS cache (studio_shared.segment_cache), read and filled by voice previews.
+
+SHARED_EXPIRY_RULE_ID = "tts-cache-expiry"
+
+_cache = SegmentCache(
+    cache_dir=settings.tts_cache_dir,
+    max_mb=settings.tts_cache_max_mb,
+    idle_days=settings.tts_cache_idle_days,
+    sweep_sec=settings.tts_cache_sweep_sec,
+    s3_prefix=settings.tts_cache_s3_prefix,
+    download=download_bytes,
+    upload=upload_bytes,
+    redis=lambda: redis_conn,
+)
+
+lookup = _cache.lookup
+put = _cache.put
+sweep = _cache.sweep
+stats = _cache.stats
+
+
+def ensure_shared_expiry():
+    # Shared entries are never evicted by reads; the bucket expires them by age, so
+    # a hot line is re-synthesized once per period and the prefix cannot grow forever.
+    if not settings.tts_cache_s3_prefix:
+        return
+    prefix = f"{settings.tts_cache_s3_prefix.strip('/')}/"
+    try:
+        ensure_expiry_rule(SHARED_EXPIRY_RULE_ID, prefix, settings.tts_cache_s3_expire_days)
+    except Exception:
+        # Some S3-compatible stores lack lifecycle support; the cache still works.
+        pass
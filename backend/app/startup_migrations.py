@@ -38,3 +38,51 @@ def run_lightweight_migrations():
                 """
             )
         )
+        conn.execute(
+            text(
+                """
+                ALTER TABLE IF EXISTS audio_jobs
+                ADD COLUMN IF NOT EXISTS render_fingerprint VARCHAR(64)
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                ALTER TABLE IF EXISTS audio_jobs
+                ADD COLUMN IF NOT EXISTS dedup_of_job_id VARCHAR(36)
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                ALTER TABLE IF EXISTS audio_jobs
+                ADD COLUMN IF NOT EXISTS stage VARCHAR(16)
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                ALTER TABLE IF EXISTS audio_jobs
+                ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                CREATE INDEX IF NOT EXISTS ix_audio_jobs_render_fingerprint
+                ON audio_jobs (render_fingerprint)
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                CREATE INDEX IF NOT EXISTS ix_audio_jobs_dedup_of_job_id
+                ON audio_jobs (dedup_of_job_id)
+                """
+            )
+        )
@@ -1,3 +1,5 @@
+from typing import Iterator, Optional
+
 import boto3
 from botocore.client import Config
 from botocore.exceptions import ClientError
@@ -20,6 +22,21 @@ def ensure_bucket():
         s3.create_bucket(Bucket=settings.s3_bucket)
 
 
+def ensure_expiry_rule(rule_id: str, prefix: str, days: int):
+    # put_bucket_lifecycle_configuration replaces the whole set, so other rules are carried over.
+    try:
+        rules = s3.get_bucket_lifecycle_configuration(Bucket=settings.s3_bucket).get("Rules", [])
+    except ClientError:
+        rules = []
+    kept = [rule for rule in rules if rule.get("ID") != rule_id]
+    if days > 0:
+        kept.append({"ID": rule_id, "Filter": {"Prefix": prefix}, "Status": "Enabled", "Expiration": {"Days": days}})
+    if kept:
+        s3.put_bucket_lifecycle_configuration(Bucket=settings.s3_bucket, LifecycleConfiguration={"Rules": kept})
+    elif rules:
+        s3.delete_bucket_lifecycle(Bucket=settings.s3_bucket)
+
+
 def upload_bytes(key: str, data: bytes, content_type: str = "application/octet-stream"):
     s3.put_object(Bucket=settings.s3_bucket, Key=key, Body=data, ContentType=content_type)
 
@@ -34,6 +51,58 @@ def download_bytes(key: str) -> bytes:
     return body.read() if body else b""
 
 
+def object_size(key: str) -> Optional[int]:
+    try:
+        return int(s3.head_object(Bucket=settings.s3_bucket, Key=key)["ContentLength"])
+    except ClientError:
+        return None
+
+
+def stream_object(key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    # Inclusive byte range, read from S3 in chunks so only one chunk is held in memory.
+    byte_range = f"bytes={start}-{'' if end is None else end}"
+    body = s3.get_object(Bucket=settings.s3_bucket, Key=key, Range=byte_range)["Body"]
+    try:
+        for chunk in body.iter_chunks(chunk_size):
+            yield chunk
+    finally:
+        body.close()
+
+
+_presign_client = None
+
+
+def presigned_url(key: str, expires_sec: int, filename: Optional[str] = None) -> str:
+    # Signed against the public endpoint: the host is part of the signature, and
+    # browsers cannot reach the internal one.
+    global _presign_client
+    if _presign_client is None:
+        _presign_client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_presign_endpoint or settings.s3_endpoint,
+            aws_access_key_id=settings.s3_access_key,
+            aws_secret_access_key=settings.s3_secret_key,
+            region_name=settings.s3_region,
+            config=Config(signature_version="s3v4"),
+        )
+    params = {"Bucket": settings.s3_bucket, "Key": key}
+    if filename:
+        params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+    return _presign_client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_sec)
+
+
+def copy_key(src_key: str, dest_key: str) -> bool:
+    try:
+        s3.copy_object(
+            Bucket=settings.s3_bucket,
+            Key=dest_key,
+            CopySource={"Bucket": settings.s3_bucket, "Key": src_key},
+        )
+        return True
+    except ClientError:
+        return False
+
+
 def delete_key(key: str):
     try:
         s3.delete_object(Bucket=settings.s3_bucket, Key=key)
@@ -1,10 +1,82 @@
-from rq import Queue
+from rq import Queue, Retry
+from rq.exceptions import InvalidJobOperation, NoSuchJobError
+from rq.job import Job, JobStatus
 import redis
+from studio_shared.queues import LEGACY, PROCESS_FUNC
+
 from .core.config import settings
 
 redis_conn = redis.from_url(settings.redis_url)
-queue = Queue("audio", connection=redis_conn)
+_queues: dict[str, Queue] = {}
+
+# Read by the worker's control.py between stages and by its watchdog.
+CANCEL_KEY = "jobs:cancel:{job_id}"
+CANCEL_TTL_SEC = 24 * 3600
+
+# The pre-split queue; the worker still drains it. Callers pass a priority queue from services/admission.py.
+DEFAULT_QUEUE = LEGACY
+
+
+def get_queue(name: str = DEFAULT_QUEUE) -> Queue:
+    if name not in _queues:
+        _queues[name] = Queue(name, connection=redis_conn)
+    return _queues[name]
+
+
+def _retry() -> Retry | None:
+    # Exponential backoff; the worker resumes a retried job from its last checkpoint.
+    if settings.job_max_retries <= 0:
+        return None
+    intervals = [settings.job_retry_base_sec * 2**attempt for attempt in range(settings.job_max_retries)]
+    return Retry(max=settings.job_max_retries, interval=intervals)
+
+
+def enqueue_audio_job(job_id: str, queue_name: str = DEFAULT_QUEUE):
+    # The RQ job id is the AudioJob id, so the job can be found in RQ from the row alone.
+    return get_queue(queue_name).enqueue(
+        PROCESS_FUNC, job_id, job_id=job_id, retry=_retry(), job_timeout=settings.job_timeout_sec
+    )
+
+
+def enqueue_audio_jobs(job_ids_by_queue: dict[str, list[str]]):
+    # One Redis pipeline for the whole batch, across queues.
+    if not any(job_ids_by_queue.values()):
+        return []
+    jobs = []
+    with redis_conn.pipeline() as pipe:
+        for queue_name, job_ids in job_ids_by_queue.items():
+            if job_ids:
+                jobs += get_queue(queue_name).enqueue_many(
+                    [
+                        Queue.prepare_data(
+                            PROCESS_FUNC,
+                            args=(job_id,),
+                            job_id=job_id,
+                            retry=_retry(),
+                            timeout=settings.job_timeout_sec,
+                        )
+                        for job_id in job_ids
+                    ],
+                    pipeline=pipe,
+                )
+        pipe.execute()
+    return jobs
+
+
+def cancel_queued_job(job_id: str) -> bool:
+    # Removes a job that no worker has started yet, including one waiting out a retry backoff.
+    try:
+        job = Job.fetch(job_id, connection=redis_conn)
+    except NoSuchJobError:
+        return False
+    if job.get_status() not in (JobStatus.QUEUED, JobStatus.SCHEDULED, JobStatus.DEFERRED):
+        return False
+    try:
+        job.cancel()
+    except InvalidJobOperation:
+        return False
+    return True
 
 
-def enqueue_audio_job(job_id: str):
-    return queue.enqueue("tasks.audio.process_audio_job", job_id)
+def request_job_stop(job_id: str):
+    redis_conn.set(CANCEL_KEY.format(job_id=job_id), 1, ex=CANCEL_TTL_SEC)
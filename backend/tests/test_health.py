@@ -9,3 +9,11 @@ def test_health():
     resp = client.get("/api/health")
     assert resp.status_code == 200
     assert resp.json()["status"] == "ok"
+
+
+def test_tts_cache_stats_shape():
+    resp = client.get("/api/health/tts-cache")
+    assert resp.status_code == 200
+    body = resp.json()
+    for field in ("local_hits", "shared_hits", "misses", "bytes_served", "hit_ratio"):
+        assert field in body
@@ -0,0 +1,272 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import models
+from app.core.config import settings
+from app.db import SessionLocal
+from app.main import app
+from app.routes import jobs as jobs_routes
+from app.routes.jobs import FAKE_USER_ID, _parse_range
+from app.services import admission
+from app.services.billing import ensure_user_exists
+from app.services.render_dedup import render_fingerprint
+
+
+def test_render_fingerprint_ignores_whitespace_noise():
+    base = render_fingerprint("Я есть спокойствие.\nЯ имею фокус.", "system_voice", "jane", "calm-1", 30)
+    noisy = render_fingerprint("  Я есть   спокойствие.\n\nЯ имею фокус.  ", "system_voice", "jane", "calm-1", 30)
+    assert base == noisy
+
+
+def test_render_fingerprint_changes_with_render_inputs():
+    base = render_fingerprint("Я есть спокойствие.", "system_voice", "jane", "calm-1", 30)
+    assert base == render_fingerprint("Я есть спокойствие.", "system_voice", None, "calm-1", 30)
+    assert base != render_fingerprint("Я есть спокойствие.", "system_voice", "alice", "calm-1", 30)
+    assert base != render_fingerprint("Я есть спокойствие.", "system_voice", "jane", "deep-1", 30)
+    assert base != render_fingerprint("Я есть спокойствие.", "system_voice", "jane", "calm-1", 120)
+
+
+def test_parse_range_forms():
+    assert _parse_range(None, 1000) is None
+    assert _parse_range("bytes=0-99", 1000) == (0, 99)
+    assert _parse_range("bytes=900-", 1000) == (900, 999)
+    assert _parse_range("bytes=-100", 1000) == (900, 999)
+    assert _parse_range("bytes=990-5000", 1000) == (990, 999)
+    assert _parse_range("bytes=0-1,5-9", 1000) is None
+    with pytest.raises(HTTPException) as exc:
+        _parse_range("bytes=1000-", 1000)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */1000"
+
+
+def test_batch_reports_item_errors_without_failing_the_batch():
+    client = TestClient(app)
+    resp = client.post(
+        "/api/jobs/batch",
+        json={
+            "jobs": [
+                {"project_id": "missing", "affirmation_text": "Я есть спокойствие."},
+                {"project_id": "missing", "affirmation_text": "Я есть фокус.", "voice_mode": "robot"},
+            ]
+        },
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["created"] == 0 and body["failed"] == 2
+    assert [item["status_code"] for item in body["items"]] == [404, 404]
+    assert client.post("/api/jobs/batch", json={"jobs": []}).status_code == 422
+
+
+def test_batch_creates_valid_items_and_spends_each_purchase_once(monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(jobs_routes, "enqueue_audio_jobs", enqueued.append)
+    monkeypatch.setattr(admission, "load_backlog", lambda: None)
+    db = SessionLocal()
+    try:
+        ensure_user_exists(db, FAKE_USER_ID)
+        project = models.Project(user_id=FAKE_USER_ID, title="batch")
+        purchase = models.Purchase(user_id=FAKE_USER_ID, duration_sec=300, status="paid")
+        db.add_all([project, purchase])
+        db.commit()
+        project_id, purchase_id = project.id, purchase.id
+    finally:
+        db.close()
+
+    tag = uuid.uuid4().hex
+    demo = {"project_id": project_id, "affirmation_text": f"Я есть спокойствие {tag}."}
+    paid = {"project_id": project_id, "duration_sec": 300, "purchase_id": purchase_id}
+    resp = TestClient(app).post(
+        "/api/jobs/batch",
+        json={
+            "jobs": [
+                demo,
+                demo,
+                {**paid, "affirmation_text": f"Я есть фокус {tag}."},
+                {**paid, "affirmation_text": f"Я имею энергию {tag}."},
+                {**demo, "voice_mode": "robot"},
+            ]
+        },
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["created"] == 3 and body["failed"] == 2
+    items = body["items"]
+    assert [item["ok"] for item in items] == [True, True, True, False, False]
+    assert [item["status_code"] for item in items[3:]] == [402, 400]
+
+    demo_id, duplicate_id, paid_id = (item["job"]["id"] for item in items[:3])
+    # The duplicate attaches to the first render instead of being queued.
+    assert enqueued == [{admission.DEMO_BULK: [demo_id], admission.PAID_BULK: [paid_id]}]
+    db = SessionLocal()
+    try:
+        assert db.get(models.AudioJob, duplicate_id).dedup_of_job_id == demo_id
+        assert db.get(models.AudioJob, paid_id).purchase_id == purchase_id
+        assert db.get(models.Purchase, purchase_id).consumed
+    finally:
+        db.close()
+
+
+def test_admission_prioritizes_and_sheds_demos():
+    def backlog(demo_depth):
+        return admission.Backlog(
+            depths={name: 0 for name in admission.QUEUE_WEIGHTS} | {admission.DEMO: demo_depth},
+            job_sec={"demo": 10.0, "paid": 60.0},
+            workers=2,
+        )
+
+    paid = admission.admit(300, backlog=backlog(4))
+    assert paid.queue_name == admission.PAID and paid.estimated_wait_sec == 5.0
+    assert admission.admit(30, backlog=backlog(4)).estimated_wait_sec == 20.0
+    deferred = admission.admit(30, backlog=backlog(settings.admission_demo_defer_backlog))
+    assert deferred.queue_name == admission.DEMO_BULK and not deferred.rejected
+    rejected = admission.admit(30, backlog=backlog(settings.admission_demo_reject_backlog))
+    assert rejected.rejected and rejected.retry_after_sec >= 1
+    assert not admission.admit(300, backlog=backlog(settings.admission_demo_reject_backlog)).rejected
+
+
+
+def _seed_paid_job(status: str, dedup_of_job_id: str | None = None) -> tuple[str, str]:
+    db = SessionLocal()
+    try:
+        ensure_user_exists(db, FAKE_USER_ID)
+        project = models.Project(user_id=FAKE_USER_ID, title="cancel")
+        purchase = models.Purchase(user_id=FAKE_USER_ID, duration_sec=120, consumed=True, consumed_at=datetime.utcnow())
+        db.add_all([project, purchase])
+        db.flush()
+        job = models.AudioJob(
+            project_id=project.id,
+            status=status,
+            input_text="Я есть спокойствие.",
+            music_track_id="calm_01",
+            duration_sec=120,
+            purchase_id=purchase.id,
+            dedup_of_job_id=dedup_of_job_id,
+        )
+        db.add(job)
+        db.commit()
+        return job.id, purchase.id
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def cancel_calls(monkeypatch):
+    calls = {"stop": [], "dequeue": [], "events": []}
+    monkeypatch.setattr(jobs_routes, "request_job_stop", calls["stop"].append)
+    monkeypatch.setattr(jobs_routes, "cancel_queued_job", calls["dequeue"].append)
+    monkeypatch.setattr(
+        jobs_routes, "publish_job_event", lambda job_id, status, error=None: calls["events"].append((job_id, status))
+    )
+    return calls
+
+
+def test_cancel_unknown_job_is_404(cancel_calls):
+    assert TestClient(app).delete("/api/jobs/missing").status_code == 404
+
+
+def test_cancel_queued_job_refunds_and_publishes(cancel_calls):
+    job_id, purchase_id = _seed_paid_job("queued")
+
+    resp = TestClient(app).delete(f"/api/jobs/{job_id}")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "cancelled"
+    assert cancel_calls == {"stop": [job_id], "dequeue": [job_id], "events": [(job_id, "cancelled")]}
+
+    db = SessionLocal()
+    try:
+        assert db.get(models.AudioJob, job_id).status == "cancelled"
+        purchase = db.get(models.Purchase, purchase_id)
+        assert not purchase.consumed and purchase.consumed_at is None
+    finally:
+        db.close()
+    assert TestClient(app).delete(f"/api/jobs/{job_id}").status_code == 409
+
+
+def test_cancel_demo_job_keeps_another_jobs_purchase_spent(cancel_calls, monkeypatch):
+    monkeypatch.setattr(jobs_routes, "enqueue_audio_job", lambda job_id, queue_name: None)
+    monkeypatch.setattr(admission, "load_backlog", lambda: None)
+    paid_id, purchase_id = _seed_paid_job("completed")
+    db = SessionLocal()
+    try:
+        project_id = db.get(models.AudioJob, paid_id).project_id
+        # A row written before purchase ids were checked on create.
+        legacy = models.AudioJob(
+            project_id=project_id, input_text="Я есть фокус.", music_track_id="calm_01", purchase_id=purchase_id
+        )
+        db.add(legacy)
+        db.commit()
+        legacy_id = legacy.id
+    finally:
+        db.close()
+
+    client = TestClient(app)
+    resp = client.post(
+        "/api/jobs",
+        json={
+            "project_id": project_id,
+            "affirmation_text": f"Я есть спокойствие {uuid.uuid4().hex}.",
+            "purchase_id": purchase_id,
+        },
+    )
+    assert resp.status_code == 200
+    demo_id = resp.json()["id"]
+
+    assert client.delete(f"/api/jobs/{demo_id}").status_code == 200
+    assert client.delete(f"/api/jobs/{legacy_id}").status_code == 200
+    db = SessionLocal()
+    try:
+        assert db.get(models.AudioJob, demo_id).purchase_id is None
+        assert db.get(models.Purchase, purchase_id).consumed
+    finally:
+        db.close()
+
+
+def test_cancel_running_job_is_left_to_the_worker(cancel_calls):
+    job_id, purchase_id = _seed_paid_job("processing")
+
+    resp = TestClient(app).delete(f"/api/jobs/{job_id}")
+    assert resp.status_code == 202
+    assert resp.json()["status"] == "cancelling"
+    assert cancel_calls == {"stop": [job_id], "dequeue": [], "events": []}
+
+    db = SessionLocal()
+    try:
+        assert db.get(models.AudioJob, job_id).status == "processing"
+        assert db.get(models.Purchase, purchase_id).consumed
+    finally:
+        db.close()
+
+
+def test_get_does_not_resolve_followers(monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(jobs_routes, "enqueue_audio_jobs", enqueued.append)
+    leader_id, _ = _seed_paid_job("failed")
+    follower_id, _ = _seed_paid_job("queued", dedup_of_job_id=leader_id)
+
+    assert TestClient(app).get(f"/api/jobs/{follower_id}").json()["status"] == "queued"
+    assert enqueued == []
+    db = SessionLocal()
+    try:
+        assert db.get(models.AudioJob, follower_id).dedup_of_job_id == leader_id
+    finally:
+        db.close()
+
+
+def test_cancelling_a_leader_requeues_its_followers(cancel_calls, monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(jobs_routes, "enqueue_audio_jobs", enqueued.append)
+    leader_id, _ = _seed_paid_job("queued")
+    follower_id, _ = _seed_paid_job("queued", dedup_of_job_id=leader_id)
+
+    assert TestClient(app).delete(f"/api/jobs/{leader_id}").status_code == 200
+    assert enqueued == [{"audio-paid": [follower_id]}]
+    db = SessionLocal()
+    try:
+        follower = db.get(models.AudioJob, follower_id)
+        assert follower.status == "queued" and follower.dedup_of_job_id is None
+    finally:
+        db.close()
@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import audio_preview
+
+client = TestClient(app)
+
+
+def test_music_preview_is_cached_with_etag(monkeypatch):
+    renders = []
+
+    def fake_render(track_id, duration_sec=10):
+        renders.append((track_id, duration_sec))
+        return b"ID3fake-preview"
+
+    monkeypatch.setattr(audio_preview, "generate_music_preview_mp3", fake_render)
+    monkeypatch.setattr(audio_preview, "_artifacts", {})
+
+    first = client.get("/api/music/calm-2/preview?duration_sec=12")
+    assert first.status_code == 200
+    assert first.content == b"ID3fake-preview"
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and "max-age=" in first.headers["cache-control"]
+
+    second = client.get("/api/music/calm-2/preview?duration_sec=12", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert renders == [("calm-2", 12)]
+
+
+def test_preview_renders_are_collapsed_and_shed(monkeypatch):
+    import asyncio
+    import threading
+
+    release = threading.Event()
+    renders = []
+
+    def slow_render(track_id, duration_sec=10):
+        renders.append(track_id)
+        release.wait(5)
+        return b"ID3slow"
+
+    monkeypatch.setattr(audio_preview, "generate_music_preview_mp3", slow_render)
+    monkeypatch.setattr(audio_preview, "_artifacts", {})
+    monkeypatch.setattr(audio_preview.settings, "preview_workers", 1)
+    monkeypatch.setattr(audio_preview.settings, "preview_queue_limit", 0)
+
+    async def scenario():
+        first = asyncio.ensure_future(audio_preview.music_preview_async("calm-1", 10))
+        second = asyncio.ensure_future(audio_preview.music_preview_async("calm-1", 10))
+        await asyncio.sleep(0.05)
+
+        busy = client.get("/api/music/deep-1/preview")
+        assert busy.status_code == 503
+        assert busy.headers["retry-after"]
+
+        release.set()
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert renders == ["calm-1"]
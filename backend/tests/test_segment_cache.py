@@ -0,0 +1,42 @@
+from studio_shared import segment_keys
+
+from app.storage import s3 as s3_storage
+
+
+def test_segment_key_format_is_pinned():
+    # Entries already in the shared bucket prefix become unreachable if this changes;
+    # bump CACHE_VERSION instead of editing the expected key.
+    key = segment_keys.segment_key("edge", {"voice": "ru-RU-SvetlanaNeural", "rate": "+0%"}, "  Я есть   спокойствие. ")
+    assert key == "76bf89f3a89bfb9651a58d0692a03b4219e6beed0956390cfbe143352e5d56dd"
+    assert segment_keys.shared_key("/tts-cache/", key) == f"tts-cache/76/{key}.mp3"
+    assert segment_keys.local_path("/tmp/c", key) == f"/tmp/c/76/{key}"
+
+
+class _LifecycleStub:
+    def __init__(self, rules):
+        self.rules = rules
+
+    def get_bucket_lifecycle_configuration(self, Bucket):
+        return {"Rules": list(self.rules)}
+
+    def put_bucket_lifecycle_configuration(self, Bucket, LifecycleConfiguration):
+        self.rules = LifecycleConfiguration["Rules"]
+
+    def delete_bucket_lifecycle(self, Bucket):
+        self.rules = []
+
+
+def test_expiry_rule_keeps_other_rules(monkeypatch):
+    other = {"ID": "uploads", "Filter": {"Prefix": "uploads/"}, "Status": "Enabled", "Expiration": {"Days": 7}}
+    stub = _LifecycleStub([other])
+    monkeypatch.setattr(s3_storage, "s3", stub)
+
+    s3_storage.ensure_expiry_rule("tts-cache-expiry", "tts-cache/", 90)
+    s3_storage.ensure_expiry_rule("tts-cache-expiry", "tts-cache/", 60)
+    assert stub.rules == [
+        other,
+        {"ID": "tts-cache-expiry", "Filter": {"Prefix": "tts-cache/"}, "Status": "Enabled", "Expiration": {"Days": 60}},
+    ]
+
+    s3_storage.ensure_expiry_rule("tts-cache-expiry", "tts-cache/", 0)
+    assert stub.rules == [other]
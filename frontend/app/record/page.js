@@ -4,7 +4,7 @@ import { useEffect, useMemo, useRef, useState } from "react";
 
 import AppNav from "../../components/AppNav";
 import { useLanguage } from "../../components/LanguageContext";
-import { apiBase, apiDelete, apiGet, apiPost } from "../../lib/api";
+import { apiBase, apiDelete, apiEvents, apiGet, apiPost } from "../../lib/api";
 import { i18n } from "../../lib/i18n";
 import { patchHistory, pushHistory, readSession, saveSession } from "../../lib/studioStorage";
 
@@ -51,6 +51,7 @@ export default function RecordPage() {
 
   const previewRef = useRef(null);
   const pollRef = useRef(null);
+  const eventsRef = useRef(null);
 
   const selectedPackage = useMemo(
     () => packages.find((item) => item.duration_sec === durationSec) || null,
@@ -94,9 +95,7 @@ export default function RecordPage() {
 
   useEffect(() => {
     return () => {
-      if (pollRef.current) {
-        clearInterval(pollRef.current);
-      }
+      stopWatching();
       if (previewRef.current) {
         previewRef.current.pause();
       }
@@ -223,6 +222,17 @@ export default function RecordPage() {
     }
   }
 
+  function stopWatching() {
+    if (pollRef.current) {
+      clearInterval(pollRef.current);
+      pollRef.current = null;
+    }
+    if (eventsRef.current) {
+      eventsRef.current.close();
+      eventsRef.current = null;
+    }
+  }
+
   async function createAudio() {
     setError("");
     setSuccess("");
@@ -292,50 +302,79 @@ export default function RecordPage() {
       setJobStatus(job.status || "queued");
       setResultUrl("");
 
-      if (pollRef.current) clearInterval(pollRef.current);
-      pollRef.current = setInterval(async () => {
-        try {
-          const status = await apiGet(`/api/jobs/${job.id}`);
-          setJobStatus(status.status || "queued");
-
-          if (status.status === "completed") {
-            const stableUrl = `${apiBase()}/api/jobs/${job.id}/result?delete_after_download=false`;
-            setResultUrl(stableUrl);
-            clearInterval(pollRef.current);
-
-            patchHistory(
-              (item) => item.projectId === projectId,
-              {
-                status: "completed",
-                jobId: job.id,
-                resultUrl: stableUrl,
-                durationSec,
-              }
-            );
+      stopWatching();
+
+      const handleStatus = (status) => {
+        setJobStatus(status.status || "queued");
+
+        if (status.status === "completed") {
+          const stableUrl = `${apiBase()}/api/jobs/${job.id}/result?delete_after_download=false`;
+          setResultUrl(stableUrl);
 
-            pushHistory({
-              id: `${Date.now()}`,
-              createdAt: new Date().toISOString(),
-              areas: session?.areas || [],
+          patchHistory(
+            (item) => item.projectId === projectId,
+            {
               status: "completed",
-              durationSec,
-              language: lang,
-              projectId,
               jobId: job.id,
               resultUrl: stableUrl,
-              affirmations: text.split("\n"),
-            });
+              durationSec,
+            }
+          );
+
+          pushHistory({
+            id: `${Date.now()}`,
+            createdAt: new Date().toISOString(),
+            areas: session?.areas || [],
+            status: "completed",
+            durationSec,
+            language: lang,
+            projectId,
+            jobId: job.id,
+            resultUrl: stableUrl,
+            affirmations: text.split("\n"),
+          });
+          return true;
+        }
+
+        if (status.status === "failed" || status.status === "cancelled") {
+          setJobError(status.error || t.common.errorDefault);
+          return true;
+        }
+        return false;
+      };
+
+      const startPolling = () => {
+        pollRef.current = setInterval(async () => {
+          try {
+            const status = await apiGet(`/api/jobs/${job.id}`);
+            if (handleStatus(status)) stopWatching();
+          } catch (_e) {
+            setJobError(t.common.errorDefault);
+            stopWatching();
           }
+        }, 2200);
+      };
 
-          if (status.status === "failed") {
-            setJobError(status.error || t.common.errorDefault);
-            clearInterval(pollRef.current);
+      // Push updates over SSE; fall back to polling when the stream cannot be opened.
+      const events = apiEvents(`/api/jobs/${job.id}/events`);
+      if (events) {
+        eventsRef.current = events;
+        events.addEventListener("status", (message) => {
+          try {
+            if (handleStatus(JSON.parse(message.data))) stopWatching();
+          } catch (_e) {
+            // Ignore malformed events; the next one carries the full status.
           }
-        } catch (_e) {
-          setJobError(t.common.errorDefault);
-          clearInterval(pollRef.current);
-        }
-      }, 2200);
+        });
+        events.onerror = () => {
+          if (events.readyState === window.EventSource.CLOSED && eventsRef.current === events) {
+            eventsRef.current = null;
+            startPolling();
+          }
+        };
+      } else {
+        startPolling();
+      }
     } catch (e) {
       setError(String(e?.message || t.common.errorDefault));
     } finally {
@@ -64,3 +64,8 @@ export async function apiDelete(path) {
 export function apiBase() {
   return runtimeBase();
 }
+
+export function apiEvents(path) {
+  if (typeof window === "undefined" || typeof window.EventSource === "undefined") return null;
+  return new window.EventSource(buildUrl(path));
+}
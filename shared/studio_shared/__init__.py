@@ -0,0 +1,4 @@
+# Code the API and the worker both run or must agree on: the TTS segment cache,
+# render version, Edge TTS client, queue names, purchase refunds. Installed into
+# both images (infra/*/Dockerfile); the services pin the third-party packages it
+# imports.
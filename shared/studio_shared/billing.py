@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from sqlalchemy import column, select, table, update
+from sqlalchemy.orm import Session
+
+# Core table stubs so the worker, which has no Purchase/Project models, runs
+# the same statement as the API.
+_purchases = table(
+    "purchases",
+    column("id"),
+    column("user_id"),
+    column("duration_sec"),
+    column("consumed"),
+    column("consumed_at"),
+)
+_projects = table("projects", column("id"), column("user_id"))
+
+
+def refund_job_purchase(db: Session, purchase_id: Optional[str], project_id: str, duration_sec: int) -> bool:
+    # Only a purchase this job could have consumed goes back: the project
+    # owner's, for the job's duration, and still marked consumed. Caller commits.
+    if not purchase_id:
+        return False
+    owner = select(_projects.c.user_id).where(_projects.c.id == project_id).scalar_subquery()
+    result = db.execute(
+        update(_purchases)
+        .where(
+            _purchases.c.id == purchase_id,
+            _purchases.c.user_id == owner,
+            _purchases.c.duration_sec == duration_sec,
+            _purchases.c.consumed.is_(True),
+        )
+        .values(consumed=False, consumed_at=None)
+    )
+    return result.rowcount > 0
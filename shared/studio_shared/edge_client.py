@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Optional
+
+import edge_tts
+
+# One long-lived event loop on a daemon thread serves every Edge TTS call in the
+# process. Sync callers submit coroutines with run_coroutine_threadsafe, so
+# concurrent chunks share the loop instead of each building and tearing down
+# their own with asyncio.run. Audio is collected from Communicate.stream() in
+# memory. The loop is rebuilt in a forked child, since the thread does not
+# survive fork.
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_loop_pid: Optional[int] = None
+_lock = threading.Lock()
+_CANCEL_POLL_SEC = 0.05
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _thread, _loop_pid
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid() or not _thread.is_alive():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="edge-tts-loop", daemon=True)
+            thread.start()
+            _loop, _thread, _loop_pid = loop, thread, os.getpid()
+        return _loop
+
+
+async def _collect(text: str, voice: str, rate: str, pitch: str) -> bytes:
+    communicate = edge_tts.Communicate(text=text, voice=voice, rate=rate, pitch=pitch)
+    chunks = []
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            chunks.append(chunk["data"])
+    return b"".join(chunks)
+
+
+def synthesize(
+    text: str,
+    voice: str,
+    rate: str = "+0%",
+    pitch: str = "+0Hz",
+    timeout: Optional[float] = None,
+    cancelled: Optional[threading.Event] = None,
+) -> bytes:
+    # Once `cancelled` is set the coroutine is cancelled on the loop, which closes
+    # its websocket, and b"" comes back instead of audio.
+    future = asyncio.run_coroutine_threadsafe(_collect(text, voice, rate, pitch), _get_loop())
+    try:
+        if cancelled is None:
+            return future.result(timeout=timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return future.result(timeout=_CANCEL_POLL_SEC)
+            except concurrent.futures.TimeoutError:
+                if cancelled.is_set():
+                    future.cancel()
+                    return b""
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+    except BaseException:
+        future.cancel()
+        raise
+
+
+async def _cancel_pending():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def warm():
+    _get_loop()
+
+
+def close():
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop = _thread = None
+    if loop is None or _loop_pid != os.getpid():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_cancel_pending(), loop).result(timeout=5)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    if not thread.is_alive():
+        loop.close()
+
+
+atexit.register(close)
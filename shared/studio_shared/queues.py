@@ -0,0 +1,23 @@
+# Audio jobs are split by who pays and how they were submitted. Workers reorder
+# their queues after every job by a weighted random draw, so paid interactive
+# renders usually go first while demos and bulk batches still get a share
+# instead of starving. The legacy "audio" queue holds jobs enqueued before the
+# split. The API's wait estimate reads the same weights.
+
+PAID = "audio-paid"
+PAID_BULK = "audio-paid-bulk"
+DEMO = "audio-demo"
+DEMO_BULK = "audio-demo-bulk"
+LEGACY = "audio"
+
+QUEUE_WEIGHTS = {
+    PAID: 8,
+    PAID_BULK: 4,
+    DEMO: 2,
+    DEMO_BULK: 1,
+    LEGACY: 1,
+}
+
+PROCESS_FUNC = "tasks.audio.process_audio_job"
+# Recent stage timings per job class, written by the worker.
+TIMINGS_KEY = "jobs:timings:{job_class}"
@@ -0,0 +1,6 @@
+# Version of the worker's audio output for identical inputs; the API puts it
+# into render fingerprints. Bump it with every change to what a render sounds
+# like: TTS chunking and pauses, provider fallbacks, the mix chain, the
+# encoder, voices or music.
+# 2: per-line TTS segments with pauses, espeak WAV path, single-pass/numpy engines.
+RENDER_VERSION = 2
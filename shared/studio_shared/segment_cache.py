@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import redis
+
+from .segment_keys import STATS_KEY, local_path, shared_key
+
+# Two-tier TTS audio cache. Tier one is a size-bounded LRU directory on the
+# local disk: reads bump the file mtime, and a sweep drops entries idle for
+# more than idle_days, then the least recently used ones until the directory
+# fits. Tier two is a shared prefix in the bucket, so one node's synthesis
+# serves every node and the API's previews; a bucket lifecycle rule set by the
+# API expires it by age. Counters live in a Redis hash.
+
+STATS_FIELDS = ("local_hits", "shared_hits", "misses", "stores", "bytes_served", "bytes_stored", "evictions")
+_SWEEP_MARKER = ".last-sweep"
+
+
+@dataclass
+class SegmentCache:
+    cache_dir: str
+    max_mb: int
+    idle_days: int
+    sweep_sec: int
+    s3_prefix: str
+    download: Callable[[str], bytes]
+    upload: Callable[..., None]
+    redis: Callable[[], redis.Redis]
+
+    def _path(self, key: str) -> str:
+        return local_path(self.cache_dir, key)
+
+    def _shared_key(self, key: str) -> str:
+        return shared_key(self.s3_prefix, key)
+
+    def _count(self, **fields: int):
+        try:
+            pipe = self.redis().pipeline(transaction=False)
+            for field, amount in fields.items():
+                if amount:
+                    pipe.hincrby(STATS_KEY, field, amount)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.idle_days * 86400:
+                return None
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _put_local(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def _get_shared(self, key: str) -> Optional[bytes]:
+        if not self.s3_prefix:
+            return None
+        try:
+            return self.download(self._shared_key(key)) or None
+        except Exception:
+            return None
+
+    def lookup(self, keys: list[str]) -> Optional[bytes]:
+        # Every candidate key on local disk first, then the shared tier, so a warm
+        # node never waits on the bucket for a key it already holds.
+        for key in keys:
+            data = self._get_local(key)
+            if data:
+                self._count(local_hits=1, bytes_served=len(data))
+                return data
+        for key in keys:
+            data = self._get_shared(key)
+            if data:
+                try:
+                    self._put_local(key, data)
+                except OSError:
+                    pass
+                self._count(shared_hits=1, bytes_served=len(data))
+                return data
+        self._count(misses=1)
+        return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.lookup([key])
+
+    def put(self, key: str, data: bytes):
+        try:
+            self._put_local(key, data)
+        except OSError:
+            pass
+        if self.s3_prefix:
+            try:
+                self.upload(self._shared_key(key), data, content_type="audio/mpeg")
+            except Exception:
+                pass
+        self._count(stores=1, bytes_stored=len(data))
+        self.maybe_sweep()
+
+    def maybe_sweep(self):
+        # At most one sweep per interval per node; the marker's mtime is shared by all processes.
+        marker = os.path.join(self.cache_dir, _SWEEP_MARKER)
+        try:
+            if time.time() - os.path.getmtime(marker) < self.sweep_sec:
+                return
+        except OSError:
+            pass
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(marker, "a"):
+                pass
+            os.utime(marker)
+        except OSError:
+            return
+        self.sweep()
+
+    def sweep(self) -> int:
+        expire_before = time.time() - self.idle_days * 86400
+        entries = []
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filenames:
+                if name == _SWEEP_MARKER:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                partial = name.endswith(".part")
+                if stat.st_mtime < expire_before or (partial and stat.st_mtime < time.time() - 3600):
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+                    continue
+                if partial:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        # Evict down to 90% of the bound so the next few writes do not trigger another pass.
+        limit = self.max_mb * 1024 * 1024
+        total = sum(size for _, size, _ in entries)
+        if total > limit:
+            for _, size, path in sorted(entries):
+                if total <= limit * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except OSError:
+                    pass
+        self._count(evictions=removed)
+        return removed
+
+    def stats(self) -> dict:
+        try:
+            raw = self.redis().hgetall(STATS_KEY)
+        except redis.RedisError:
+            return {"available": False, **{field: 0 for field in STATS_FIELDS}, "hit_ratio": 0.0}
+
+        values = {field: int(raw.get(field.encode(), 0)) for field in STATS_FIELDS}
+        lookups = values["local_hits"] + values["shared_hits"] + values["misses"]
+        hits = values["local_hits"] + values["shared_hits"]
+        return {"available": True, **values, "hit_ratio": round(hits / lookups, 4) if lookups else 0.0}
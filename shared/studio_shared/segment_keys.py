@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+
+# Bump to invalidate every entry after a change in how audio is produced.
+CACHE_VERSION = 1
+STATS_KEY = "tts:cache:stats"
+
+
+def normalize_line(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip()
+
+
+def segment_key(provider: str, voice_params, line: str) -> str:
+    # voice_params carries the full preset (voice, rate, pitch, ...), so editing a preset changes the key.
+    payload = {"v": CACHE_VERSION, "provider": provider, "voice": voice_params, "text": normalize_line(line)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def local_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key[:2], key)
+
+
+def shared_key(prefix: str, key: str) -> str:
+    return f"{prefix.strip('/')}/{key[:2]}/{key}.mp3"
@@ -1,26 +1,22 @@
 from __future__ import annotations
 
-import os
-import subprocess
-import tempfile
-import uuid
+from typing import Iterator
 
+import dsp_engine
+import mp3_frames
+import wav_pcm
 from config import settings
+from ffmpeg_io import fifo_inputs, run_pipe, stream_pipe
+from music_beds import ensure_bed
 
 
-MUSIC_FILTERS = {
-    "calm-1": "0.014*sin(2*PI*174*t)+0.011*sin(2*PI*220*t)+0.007*sin(2*PI*261*t)",
-    "calm-2": "0.012*sin(2*PI*164*t)+0.010*sin(2*PI*207*t)+0.006*sin(2*PI*246*t)",
-    "calm-3": "0.013*sin(2*PI*196*t)+0.010*sin(2*PI*247*t)+0.006*sin(2*PI*294*t)",
-    "deep-1": "0.015*sin(2*PI*130*t)+0.010*sin(2*PI*165*t)+0.006*sin(2*PI*196*t)",
-}
-
-
-def _run(cmd: list[str]):
-    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
+def _probe_duration(data: bytes) -> float:
+    parse_duration = wav_pcm.duration_sec if wav_pcm.is_wav(data) else mp3_frames.duration_sec
+    try:
+        return max(1.0, parse_duration(data))
+    except ValueError:
+        pass
 
-def _probe_duration(path: str) -> float:
     cmd = [
         "ffprobe",
         "-v",
@@ -29,33 +25,30 @@ def _probe_duration(path: str) -> float:
         "format=duration",
         "-of",
         "default=noprint_wrappers=1:nokey=1",
-        path,
+        "pipe:0",
     ]
-    out = subprocess.check_output(cmd).decode("utf-8").strip()
+    out = run_pipe(cmd, data).decode("utf-8").strip()
     try:
         return max(1.0, float(out))
     except Exception:
         return 8.0
 
 
-def _generate_music_bed(track_id: str, duration_sec: float, out_path: str):
+def _music_input(track_id: str, duration_sec: float) -> list[str]:
+    # Loop the pre-rendered bed instead of evaluating the sine expressions per job.
+    return ["-stream_loop", "-1", "-t", str(duration_sec), "-i", ensure_bed(track_id)]
+
+
+def _generate_music_bed(track_id: str, duration_sec: float) -> bytes:
     ffmpeg = settings.ffmpeg_path
-    expr = MUSIC_FILTERS.get(track_id, MUSIC_FILTERS["calm-1"])
-    source = f"aevalsrc={expr}:s=44100"
     fade_out_start = max(0.0, duration_sec - 2.0)
 
-    _run(
+    return run_pipe(
         [
             ffmpeg,
-            "-y",
-            "-f",
-            "lavfi",
-            "-i",
-            source,
-            "-t",
-            str(duration_sec),
+            *_music_input(track_id, duration_sec),
             "-af",
-            f"lowpass=f=1800,afade=t=in:st=0:d=1,afade=t=out:st={fade_out_start}:d=2",
+            f"afade=t=in:st=0:d=1,afade=t=out:st={fade_out_start}:d=2",
             "-ar",
             "44100",
             "-ac",
@@ -64,19 +57,26 @@ def _generate_music_bed(track_id: str, duration_sec: float, out_path: str):
             "libmp3lame",
             "-b:a",
             "192k",
-            out_path,
+            "-f",
+            "mp3",
+            "pipe:1",
         ]
     )
 
 
-def _fit_to_duration(in_path: str, duration_sec: int, out_path: str):
+def _fit_to_duration(data: bytes, duration_sec: int) -> bytes:
+    # Frame-boundary trim/pad without a decode and re-encode; ffmpeg only for non-MP3 input.
+    try:
+        return mp3_frames.fit(data, duration_sec)
+    except ValueError:
+        pass
+
     ffmpeg = settings.ffmpeg_path
-    _run(
+    return run_pipe(
         [
             ffmpeg,
-            "-y",
             "-i",
-            in_path,
+            "pipe:0",
             "-af",
             f"apad=pad_dur={duration_sec},atrim=0:{duration_sec}",
             "-ar",
@@ -87,41 +87,90 @@ def _fit_to_duration(in_path: str, duration_sec: int, out_path: str):
             "libmp3lame",
             "-b:a",
             "192k",
-            out_path,
-        ]
+            "-f",
+            "mp3",
+            "pipe:1",
+        ],
+        data,
+    )
+
+
+def _single_pass_graph(duration_sec: int) -> str:
+    fade_out_start = max(0, duration_sec - 2)
+    return (
+        "[0:a]loudnorm=I=-16:LRA=11:TP=-1.5[voice];"
+        "[1:a]volume=-14dB,"
+        f"afade=t=in:st=0:d=1,afade=t=out:st={fade_out_start}:d=2[music];"
+        "[voice][music]amix=inputs=2:duration=longest:dropout_transition=2[mix];"
+        f"[mix]loudnorm=I=-16:LRA=11:TP=-1.5,apad=whole_dur={duration_sec},atrim=0:{duration_sec}[out]"
     )
 
 
+def _single_pass_stream(voice_bytes: bytes, music_track_id: str, target_duration_sec: int) -> Iterator[bytes]:
+    # One ffmpeg process: music synthesis, voice loudnorm, amix, pad/trim and a single MP3 encode.
+    ffmpeg = settings.ffmpeg_path
+    duration = int(target_duration_sec)
+
+    return stream_pipe(
+        [
+            ffmpeg,
+            "-i",
+            "pipe:0",
+            *_music_input(music_track_id, duration),
+            "-filter_complex",
+            _single_pass_graph(duration),
+            "-map",
+            "[out]",
+            "-ar",
+            "44100",
+            "-ac",
+            "2",
+            "-c:a",
+            "libmp3lame",
+            "-b:a",
+            "192k",
+            "-f",
+            "mp3",
+            "pipe:1",
+        ],
+        voice_bytes,
+    )
+
+
+def render_stream(voice_bytes: bytes, music_track_id: str, target_duration_sec: int) -> Iterator[bytes]:
+    # Encoded MP3 chunks, yielded while the encoder is still running where the engine allows it.
+    mode = settings.audio_render_mode.lower()
+    if mode == "legacy":
+        return iter([_mix_legacy(voice_bytes, music_track_id, target_duration_sec)])
+    if mode == "numpy":
+        return dsp_engine.render_stream(voice_bytes, music_track_id, target_duration_sec)
+    return _single_pass_stream(voice_bytes, music_track_id, target_duration_sec)
+
+
 def mix_and_master_mp3(voice_bytes: bytes, music_track_id: str, target_duration_sec: int) -> bytes:
+    return b"".join(render_stream(voice_bytes, music_track_id, target_duration_sec))
+
+
+def _mix_legacy(voice_bytes: bytes, music_track_id: str, target_duration_sec: int) -> bytes:
     ffmpeg = settings.ffmpeg_path
-    temp_id = str(uuid.uuid4())
-
-    with tempfile.TemporaryDirectory(prefix=f"audio-{temp_id}-") as tmp:
-        voice_in = os.path.join(tmp, "voice_input.mp3")
-        music_in = os.path.join(tmp, "music_input.mp3")
-        out_mp3 = os.path.join(tmp, "final.mp3")
-        out_fitted_mp3 = os.path.join(tmp, "final_fitted.mp3")
-
-        with open(voice_in, "wb") as file:
-            file.write(voice_bytes)
-
-        duration = max(float(target_duration_sec), _probe_duration(voice_in))
-        _generate_music_bed(track_id=music_track_id, duration_sec=duration, out_path=music_in)
-
-        fade_out_start = max(0.0, duration - 2.0)
-        filter_graph = (
-            "[0:a]loudnorm=I=-16:LRA=11:TP=-1.5[voice];"
-            f"[1:a]volume=-14dB,afade=t=in:st=0:d=1,afade=t=out:st={fade_out_start}:d=2[music];"
-            "[voice][music]amix=inputs=2:duration=longest:dropout_transition=2[mix];"
-            "[mix]loudnorm=I=-16:LRA=11:TP=-1.5[out]"
-        )
 
-        _run(
+    duration = max(float(target_duration_sec), _probe_duration(voice_bytes))
+    music_bytes = _generate_music_bed(track_id=music_track_id, duration_sec=duration)
+
+    fade_out_start = max(0.0, duration - 2.0)
+    filter_graph = (
+        "[0:a]loudnorm=I=-16:LRA=11:TP=-1.5[voice];"
+        f"[1:a]volume=-14dB,afade=t=in:st=0:d=1,afade=t=out:st={fade_out_start}:d=2[music];"
+        "[voice][music]amix=inputs=2:duration=longest:dropout_transition=2[mix];"
+        "[mix]loudnorm=I=-16:LRA=11:TP=-1.5[out]"
+    )
+
+    with fifo_inputs(music_bytes) as (music_in,):
+        mixed = run_pipe(
             [
                 ffmpeg,
-                "-y",
                 "-i",
-                voice_in,
+                "pipe:0",
                 "-i",
                 music_in,
                 "-filter_complex",
@@ -136,10 +185,11 @@ def mix_and_master_mp3(voice_bytes: bytes, music_track_id: str, target_duration_
                 "libmp3lame",
                 "-b:a",
                 "192k",
-                out_mp3,
-            ]
+                "-f",
+                "mp3",
+                "pipe:1",
+            ],
+            voice_bytes,
         )
 
-        _fit_to_duration(out_mp3, target_duration_sec, out_fitted_mp3)
-        with open(out_fitted_mp3, "rb") as file:
-            return file.read()
+    return _fit_to_duration(mixed, target_duration_sec)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from storage import delete_prefix, download_bytes, upload_bytes
+
+# Per-job intermediate artifacts in the bucket, so a retried job resumes after
+# its last completed stage instead of paying for TTS again. The mixed output is
+# checkpointed at its final results/ key, and music beds are already persisted
+# by music_beds, so only the synthesized voice lives here. Checkpoints are
+# removed once the job completes or fails for good.
+
+PREFIX = "checkpoints"
+
+# AudioJob.stage values, in order: the last stage whose output is stored.
+STAGE_TTS = "tts"
+STAGE_MIX = "mix"
+
+
+def _key(job_id: str, name: str) -> str:
+    return f"{PREFIX}/{job_id}/{name}"
+
+
+def save(job_id: str, name: str, data: bytes) -> bool:
+    # Best effort: a job whose checkpoint could not be stored carries on, it just cannot resume.
+    try:
+        upload_bytes(_key(job_id, name), data, content_type="application/octet-stream")
+        return True
+    except Exception:
+        return False
+
+
+def load(job_id: str, name: str) -> Optional[bytes]:
+    try:
+        return download_bytes(_key(job_id, name)) or None
+    except Exception:
+        return None
+
+
+def clear(job_id: str):
+    try:
+        delete_prefix(f"{PREFIX}/{job_id}/")
+    except Exception:
+        pass
@@ -12,10 +12,79 @@ class Settings(BaseSettings):
     s3_bucket: str
     s3_region: str = "us-east-1"
     s3_public_url: str
+    # S3's minimum part size. A 300 s render at 192 kbps is ~7.2 MB, so its
+    # first part goes up while ffmpeg is still encoding; larger parts would
+    # turn every render into a single put_object after encoding.
+    s3_multipart_part_mb: int = 5
+    s3_upload_concurrency: int = 2
 
     ffmpeg_path: str = "ffmpeg"
     espeak_path: str = "espeak-ng"
     tts_provider: str = "edge"
+    tts_segment_cache_enabled: bool = True
+    tts_segment_cache_dir: str = "/tmp/tts-segments"
+    tts_segment_pause_ms: int = 700
+    # Local tier: LRU-evicted above max_mb; entries not read for idle_days expire.
+    # Shared tier: bucket prefix read and written by every node; empty disables it.
+    # The API's lifecycle rule expires it by age (TTS_CACHE_S3_EXPIRE_DAYS there).
+    tts_cache_max_mb: int = 1024
+    tts_cache_idle_days: int = 30
+    tts_cache_sweep_sec: int = 60
+    tts_cache_s3_prefix: str = "tts-cache"
+    tts_chunk_chars: int = 1000
+    tts_parallel_chunks: int = 6
+    tts_concurrency_yandex: int = 4
+    tts_concurrency_salute: int = 4
+    tts_concurrency_edge: int = 4
+    tts_concurrency_espeak: int = 2
+
+    # Provider health is shared through Redis; a breaker opens after consecutive
+    # failures or repeated timeouts and lets one probe through after open_sec.
+    tts_breaker_failures: int = 3
+    tts_breaker_timeouts: int = 2
+    tts_breaker_window: int = 20
+    tts_breaker_open_sec: int = 30
+    tts_latency_routing: bool = True
+    tts_routing_bucket_ms: int = 750
+    # Hedging for demo jobs: race a second provider once the first runs past this
+    # percentile of its latency, with hedges capped at budget * eligible requests.
+    tts_hedge_enabled: bool = True
+    tts_hedge_percentile: float = 0.9
+    tts_hedge_budget: float = 0.1
+    tts_hedge_min_samples: int = 5
+    tts_hedge_window_sec: int = 300
+
+    tts_http_timeout_sec: float = 40.0
+    tts_http_connect_timeout_sec: float = 5.0
+    tts_http_max_connections: int = 8
+    tts_http_max_keepalive: int = 8
+    tts_http_keepalive_expiry_sec: float = 60.0
+    # Needs the optional "h2" package; ignored when it is not installed.
+    tts_http2: bool = False
+    # single_pass: one ffmpeg graph per job; numpy: in-process mix, ffmpeg only encodes;
+    # legacy: bed, mix and fit as separate encodes.
+    audio_render_mode: str = "single_pass"
+    music_bed_dir: str = "/tmp/music-beds"
+    # Optional S3 prefix mirroring rendered beds between worker nodes; empty disables it.
+    music_bed_s3_prefix: str = ""
+    # Per-stage deadlines for a running job; past one, its ffmpeg/espeak processes
+    # are killed and the job fails with its purchase refunded.
+    stage_deadline_tts_sec: int = 300
+    stage_deadline_render_sec: int = 180
+    stage_deadline_upload_sec: int = 120
+    # Retries for renders the worker enqueues itself; keep equal to the API's JOB_* settings.
+    job_max_retries: int = 3
+    job_retry_base_sec: int = 15
+    # launcher.py: long-lived worker processes, each recycled after max_jobs jobs (0 = never).
+    worker_processes: int = 2
+    worker_max_jobs: int = 500
+    worker_class: str = "queues.InlineWorker"
+    # pipeline_worker.PipelineWorker: jobs in flight per process and threads per
+    # stage; render_workers=0 sizes the render pool to the CPU count.
+    pipeline_max_jobs: int = 6
+    pipeline_tts_workers: int = 4
+    pipeline_render_workers: int = 0
+    pipeline_upload_workers: int = 2
 
     yandex_api_key: str = ""
     yandex_tts_url: str = "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize"
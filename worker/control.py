@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import subprocess
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+import redis
+
+from config import settings
+from redis_client import get_redis
+
+# Cancellation and per-stage deadlines for running jobs. The API asks for a
+# cancel by setting jobs:cancel:{job_id} in Redis. Each stage runs inside
+# stage(), which binds a scope to the current context. One watchdog thread per
+# process polls the flags of all open scopes and their deadlines, and on either
+# it kills the ffmpeg/espeak processes started in that scope. The stage then
+# ends with JobCancelled or StageDeadlineExceeded. Network calls cannot be
+# killed; they are bounded by their own timeouts, and check() between TTS
+# chunks stops the rest of the stage. Thread pools working for a stage must
+# wrap their callables with bind() to carry the scope along.
+
+CANCEL_KEY = "jobs:cancel:{job_id}"
+_POLL_SEC = 1.0
+
+
+class JobStopped(Exception):
+    pass
+
+
+class JobCancelled(JobStopped):
+    pass
+
+
+class StageDeadlineExceeded(JobStopped):
+    pass
+
+
+@dataclass(eq=False)
+class _Scope:
+    job_id: str
+    stage: str
+    deadline: float
+    procs: set = field(default_factory=set)
+    reason: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def stop(self, reason: str):
+        with self.lock:
+            if self.reason:
+                return
+            self.reason = reason
+            procs = list(self.procs)
+        for proc in procs:
+            _kill(proc)
+
+    def error(self) -> JobStopped:
+        if self.reason == "deadline":
+            return StageDeadlineExceeded(f"Stage deadline exceeded: {self.stage}")
+        return JobCancelled("Cancelled")
+
+
+_current: ContextVar[Optional[_Scope]] = ContextVar("job_scope", default=None)
+_scopes: set[_Scope] = set()
+_scopes_lock = threading.Lock()
+_watchdog_pid: Optional[int] = None
+
+
+def _kill(proc: subprocess.Popen):
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+
+def is_cancel_requested(job_id: str) -> bool:
+    try:
+        return bool(get_redis().exists(CANCEL_KEY.format(job_id=job_id)))
+    except redis.RedisError:
+        return False
+
+
+def clear_cancel(job_id: str):
+    try:
+        get_redis().delete(CANCEL_KEY.format(job_id=job_id))
+    except redis.RedisError:
+        pass
+
+
+def _watch():
+    while True:
+        time.sleep(_POLL_SEC)
+        with _scopes_lock:
+            scopes = [scope for scope in _scopes if not scope.reason]
+        if not scopes:
+            continue
+        now = time.monotonic()
+        flags = [False] * len(scopes)
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for scope in scopes:
+                pipe.exists(CANCEL_KEY.format(job_id=scope.job_id))
+            flags = [bool(value) for value in pipe.execute()]
+        except redis.RedisError:
+            pass
+        for scope, cancelled in zip(scopes, flags):
+            if cancelled:
+                scope.stop("cancelled")
+            elif now > scope.deadline:
+                scope.stop("deadline")
+
+
+def _ensure_watchdog():
+    global _watchdog_pid
+    with _scopes_lock:
+        if _watchdog_pid == os.getpid():
+            return
+        _watchdog_pid = os.getpid()
+    threading.Thread(target=_watch, name="job-watchdog", daemon=True).start()
+
+
+def deadline_sec(stage_name: str) -> float:
+    return float(getattr(settings, f"stage_deadline_{stage_name}_sec"))
+
+
+@contextlib.contextmanager
+def stage(job_id: str, *names: str) -> Iterator[None]:
+    # Several names share one scope and the sum of their deadlines, for stages that run fused.
+    if is_cancel_requested(job_id):
+        raise JobCancelled("Cancelled")
+    scope = _Scope(
+        job_id=job_id,
+        stage="+".join(names),
+        deadline=time.monotonic() + sum(deadline_sec(name) for name in names),
+    )
+    _ensure_watchdog()
+    with _scopes_lock:
+        _scopes.add(scope)
+    token = _current.set(scope)
+    try:
+        yield
+    except Exception as exc:
+        if scope.reason:
+            raise scope.error() from exc
+        raise
+    finally:
+        _current.reset(token)
+        with _scopes_lock:
+            _scopes.discard(scope)
+    if scope.reason:
+        raise scope.error()
+
+
+def check():
+    scope = _current.get()
+    if scope and scope.reason:
+        raise scope.error()
+
+
+def bind(fn: Callable) -> Callable:
+    scope = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(scope)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+@contextlib.contextmanager
+def tracked(proc: subprocess.Popen) -> Iterator[subprocess.Popen]:
+    scope = _current.get()
+    if scope is None:
+        yield proc
+        return
+    with scope.lock:
+        scope.procs.add(proc)
+        stopped = scope.reason is not None
+    if stopped:
+        _kill(proc)
+    try:
+        yield proc
+    finally:
+        with scope.lock:
+            scope.procs.discard(proc)
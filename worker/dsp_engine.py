@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import wave
+from typing import Iterator
+
+import numpy as np
+
+import wav_pcm
+from config import settings
+from ffmpeg_io import run_pipe, stream_pipe
+from music_beds import BED_SAMPLE_RATE, ensure_bed
+
+
+SAMPLE_RATE = BED_SAMPLE_RATE
+CHANNELS = 2
+TARGET_LUFS = -16.0
+MUSIC_GAIN_DB = -14.0
+DUCK_GAIN_DB = -6.0
+LIMIT_CEILING_DBFS = -1.5
+BLOCK_SEC = 0.01
+
+
+def _db_to_gain(db: float) -> float:
+    return float(10.0 ** (db / 20.0))
+
+
+def _resample(signal: np.ndarray, source_rate: int) -> np.ndarray:
+    # Band-limited FFT resampling; espeak speaks at 22050 Hz, the mix runs at SAMPLE_RATE.
+    if source_rate == SAMPLE_RATE or len(signal) == 0:
+        return signal
+    frames = int(round(len(signal) * SAMPLE_RATE / source_rate))
+    spectrum = np.fft.rfft(signal, axis=0)
+    bins = frames // 2 + 1
+    if bins > len(spectrum):
+        spectrum = np.concatenate([spectrum, np.zeros((bins - len(spectrum), signal.shape[1]), spectrum.dtype)])
+    resampled = np.fft.irfft(spectrum[:bins], n=frames, axis=0) * (frames / len(signal))
+    return resampled.astype(np.float32)
+
+
+def _wav_to_float(audio: wav_pcm.WavAudio) -> np.ndarray:
+    width = audio.sample_width
+    raw = np.frombuffer(audio.pcm[: audio.frames * audio.frame_size], dtype=np.uint8)
+    if width == 1:
+        samples = (raw.astype(np.float32) - 128.0) / 128.0
+    elif width == 3:
+        padded = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = raw.reshape(-1, 3)
+        samples = padded.view("<i4").ravel().astype(np.float32) / 2147483648.0
+    else:
+        samples = raw.view(f"<i{width}").astype(np.float32) / float(2 ** (8 * width - 1))
+    samples = samples.reshape(-1, audio.channels)
+    if audio.channels == 1:
+        samples = np.repeat(samples, CHANNELS, axis=1)
+    elif audio.channels != CHANNELS:
+        samples = np.repeat(samples.mean(axis=1, keepdims=True), CHANNELS, axis=1)
+    return _resample(samples, audio.sample_rate)
+
+
+def _decode_voice(voice_bytes: bytes) -> np.ndarray:
+    # PCM input (espeak) is converted in-process; everything else is decoded by ffmpeg.
+    if wav_pcm.is_wav(voice_bytes):
+        try:
+            return _wav_to_float(wav_pcm.parse(voice_bytes))
+        except ValueError:
+            pass
+
+    pcm = run_pipe(
+        [
+            settings.ffmpeg_path,
+            "-v",
+            "error",
+            "-i",
+            "pipe:0",
+            "-f",
+            "f32le",
+            "-ar",
+            str(SAMPLE_RATE),
+            "-ac",
+            str(CHANNELS),
+            "pipe:1",
+        ],
+        voice_bytes,
+    )
+    return np.frombuffer(pcm, dtype=np.float32).reshape(-1, CHANNELS)
+
+
+def _load_music(track_id: str, frames: int) -> np.ndarray:
+    with wave.open(ensure_bed(track_id), "rb") as bed:
+        raw = bed.readframes(bed.getnframes())
+    loop = np.frombuffer(raw, dtype=np.int16).reshape(-1, CHANNELS).astype(np.float32) / 32768.0
+    reps = -(-frames // len(loop))
+    return np.tile(loop, (reps, 1))[:frames]
+
+
+def _block_rms(signal: np.ndarray, block: int) -> np.ndarray:
+    mono = signal.mean(axis=1)
+    usable = len(mono) - len(mono) % block
+    if usable == 0:
+        return np.zeros(1, dtype=np.float32)
+    blocks = mono[:usable].reshape(-1, block)
+    return np.sqrt(np.mean(blocks * blocks, axis=1))
+
+
+def _biquad_response(b: tuple, a: tuple, freqs: np.ndarray) -> np.ndarray:
+    z = np.exp(-2j * np.pi * freqs / SAMPLE_RATE)
+    return np.abs((b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z))
+
+
+def _k_weighting_response(freqs: np.ndarray) -> np.ndarray:
+    # BS.1770 pre-filter (high shelf) and RLB high-pass, recomputed for SAMPLE_RATE.
+    gain_a = 10.0 ** (4.0 / 40.0)
+    w0 = 2.0 * np.pi * 1500.0 / SAMPLE_RATE
+    alpha = np.sin(w0) / (2.0 * (1.0 / np.sqrt(2.0)))
+    cos_w0 = np.cos(w0)
+    root = 2.0 * np.sqrt(gain_a) * alpha
+    shelf = _biquad_response(
+        (
+            gain_a * ((gain_a + 1) + (gain_a - 1) * cos_w0 + root),
+            -2.0 * gain_a * ((gain_a - 1) + (gain_a + 1) * cos_w0),
+            gain_a * ((gain_a + 1) + (gain_a - 1) * cos_w0 - root),
+        ),
+        (
+            (gain_a + 1) - (gain_a - 1) * cos_w0 + root,
+            2.0 * ((gain_a - 1) - (gain_a + 1) * cos_w0),
+            (gain_a + 1) - (gain_a - 1) * cos_w0 - root,
+        ),
+        freqs,
+    )
+    w0 = 2.0 * np.pi * 38.0 / SAMPLE_RATE
+    alpha = np.sin(w0) / (2.0 * 0.5)
+    cos_w0 = np.cos(w0)
+    highpass = _biquad_response(
+        ((1 + cos_w0) / 2.0, -(1 + cos_w0), (1 + cos_w0) / 2.0),
+        (1 + alpha, -2.0 * cos_w0, 1 - alpha),
+        freqs,
+    )
+    return (shelf * highpass).astype(np.float32)
+
+
+def _k_weighted_power(signal: np.ndarray) -> np.ndarray:
+    # Magnitude-only K-weighting applied in the frequency domain over overlapping
+    # chunks, so memory stays bounded for long renders. Returns per-frame power.
+    chunk = SAMPLE_RATE * 10
+    margin = SAMPLE_RATE
+    size = chunk + 2 * margin
+    response = _k_weighting_response(np.fft.rfftfreq(size, d=1.0 / SAMPLE_RATE))
+    power = np.zeros(len(signal), dtype=np.float32)
+    for start in range(0, len(signal), chunk):
+        lo = max(0, start - margin)
+        hi = min(len(signal), start + chunk + margin)
+        for channel in range(signal.shape[1]):
+            filtered = np.fft.irfft(np.fft.rfft(signal[lo:hi, channel], n=size) * response, n=size)
+            part = filtered[start - lo : start - lo + min(chunk, len(signal) - start)]
+            power[start : start + len(part)] += (part * part).astype(np.float32)
+    return power
+
+
+def integrated_loudness(signal: np.ndarray) -> float:
+    # BS.1770 gated loudness: 400 ms blocks, 75% overlap, -70 LUFS absolute and -10 LU relative gates.
+    block = int(SAMPLE_RATE * 0.4)
+    step = block // 4
+    if len(signal) < block:
+        return -70.0
+    cumulative = np.concatenate(([0.0], np.cumsum(_k_weighted_power(signal), dtype=np.float64)))
+    starts = np.arange(0, len(signal) - block + 1, step)
+    blocks = (cumulative[starts + block] - cumulative[starts]) / block
+    blocks = blocks[-0.691 + 10.0 * np.log10(np.maximum(blocks, 1e-12)) > -70.0]
+    if blocks.size == 0:
+        return -70.0
+    relative_gate = -0.691 + 10.0 * np.log10(np.mean(blocks)) - 10.0
+    gated = blocks[-0.691 + 10.0 * np.log10(blocks) > relative_gate]
+    return float(-0.691 + 10.0 * np.log10(np.mean(gated if gated.size else blocks)))
+
+
+def _normalize_loudness(signal: np.ndarray, target_lufs: float) -> np.ndarray:
+    loudness = integrated_loudness(signal)
+    if loudness <= -70.0:
+        return signal
+    signal *= _db_to_gain(target_lufs - loudness)
+    return signal
+
+
+def _apply_fades(signal: np.ndarray, fade_in_sec: float, fade_out_sec: float):
+    fade_in = min(len(signal), int(SAMPLE_RATE * fade_in_sec))
+    fade_out = min(len(signal), int(SAMPLE_RATE * fade_out_sec))
+    if fade_in:
+        signal[:fade_in] *= np.linspace(0.0, 1.0, fade_in, dtype=np.float32)[:, None]
+    if fade_out:
+        signal[-fade_out:] *= np.linspace(1.0, 0.0, fade_out, dtype=np.float32)[:, None]
+
+
+def _block_envelope(values: np.ndarray, frames: int, block: int) -> np.ndarray:
+    centers = np.arange(len(values)) * block + block / 2
+    return np.interp(np.arange(frames), centers, values).astype(np.float32)
+
+
+def _duck_gain(voice: np.ndarray, block: int) -> np.ndarray:
+    # Music dips while the voice is active; 300 ms smoothing acts as attack/release.
+    rms = _block_rms(voice, block)
+    active = (rms > _db_to_gain(-45.0)).astype(np.float32)
+    smooth = max(1, int(0.3 / BLOCK_SEC))
+    active = np.convolve(active, np.ones(smooth, dtype=np.float32) / smooth, mode="same")
+    gains = 1.0 - active * (1.0 - _db_to_gain(DUCK_GAIN_DB))
+    return _block_envelope(gains, len(voice), block)
+
+
+def _limit_peaks(signal: np.ndarray, block: int):
+    # Per-block gain is the minimum required over the block and its neighbours,
+    # so linear interpolation between blocks never overshoots the ceiling.
+    ceiling = _db_to_gain(LIMIT_CEILING_DBFS)
+    peaks = np.abs(signal).max(axis=1)
+    usable = len(peaks) - len(peaks) % block
+    tail = peaks[usable:]
+    block_peaks = peaks[:usable].reshape(-1, block).max(axis=1) if usable else np.zeros(0, dtype=np.float32)
+    if tail.size:
+        block_peaks = np.append(block_peaks, tail.max())
+    required = np.minimum(1.0, ceiling / np.maximum(block_peaks, 1e-9))
+    padded = np.pad(required, 1, mode="edge")
+    gains = np.minimum(np.minimum(padded[:-2], padded[1:-1]), padded[2:])
+    signal *= _block_envelope(gains, len(signal), block)[:, None]
+
+
+def _encode_stream(pcm: np.ndarray) -> Iterator[bytes]:
+    return stream_pipe(
+        [
+            settings.ffmpeg_path,
+            "-v",
+            "error",
+            "-f",
+            "f32le",
+            "-ar",
+            str(SAMPLE_RATE),
+            "-ac",
+            str(CHANNELS),
+            "-i",
+            "pipe:0",
+            "-c:a",
+            "libmp3lame",
+            "-b:a",
+            "192k",
+            "-f",
+            "mp3",
+            "pipe:1",
+        ],
+        np.ascontiguousarray(pcm, dtype=np.float32).tobytes(),
+    )
+
+
+def render_mix(voice_bytes: bytes, music_track_id: str, target_duration_sec: int) -> np.ndarray:
+    frames = int(target_duration_sec) * SAMPLE_RATE
+    block = int(SAMPLE_RATE * BLOCK_SEC)
+
+    voice = np.zeros((frames, CHANNELS), dtype=np.float32)
+    decoded = _normalize_loudness(_decode_voice(voice_bytes).copy(), TARGET_LUFS)[:frames]
+    voice[: len(decoded)] = decoded
+
+    music = _load_music(music_track_id, frames)
+    music *= _db_to_gain(MUSIC_GAIN_DB)
+    _apply_fades(music, fade_in_sec=1.0, fade_out_sec=2.0)
+    music *= _duck_gain(voice, block)[:, None]
+
+    mix = voice
+    mix += music
+    _normalize_loudness(mix, TARGET_LUFS)
+    _limit_peaks(mix, block)
+    return mix
+
+
+def render_stream(voice_bytes: bytes, music_track_id: str, target_duration_sec: int) -> Iterator[bytes]:
+    return _encode_stream(render_mix(voice_bytes, music_track_id, target_duration_sec))
+
+
+def mix_and_master_mp3(voice_bytes: bytes, music_track_id: str, target_duration_sec: int) -> bytes:
+    return b"".join(render_stream(voice_bytes, music_track_id, target_duration_sec))
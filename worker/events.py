@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Optional
+
+import redis
+
+from redis_client import get_redis
+
+# Job status and stage progress on Redis pub/sub, one channel per job. The API
+# forwards them to browsers over SSE/WebSocket. Delivery is best effort: the
+# database stays the source of truth and subscribers read it once on connect.
+
+CHANNEL_PREFIX = "jobs:events:"
+
+
+def channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+
+def publish(
+    job_id: str,
+    status: str,
+    stage: Optional[str] = None,
+    progress: Optional[float] = None,
+    error: Optional[str] = None,
+):
+    payload = {
+        "job_id": job_id,
+        "status": status,
+        "stage": stage,
+        "progress": progress,
+        "error": error,
+        "ts": time.time(),
+    }
+    try:
+        get_redis().publish(channel(job_id), json.dumps(payload))
+    except redis.RedisError:
+        pass
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Iterator, Optional
+
+import control
+
+
+def run_pipe(cmd: list[str], input_bytes: Optional[bytes] = None) -> bytes:
+    # stdin/stdout pipes instead of temp files; commands read "pipe:0" and write "pipe:1".
+    # The process is tracked so a cancelled or overdue job can kill it.
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if input_bytes is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    with control.tracked(proc):
+        stdout, stderr = proc.communicate(input_bytes)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr=stderr)
+    return stdout
+
+
+def _feed_fifo(path: str, data: bytes):
+    try:
+        with open(path, "wb") as fifo:
+            fifo.write(data)
+    except BrokenPipeError:
+        pass
+
+
+@contextlib.contextmanager
+def fifo_inputs(*payloads: bytes) -> Iterator[list[str]]:
+    # Named pipes for commands that need more than one in-memory input; only the
+    # pipe nodes touch the filesystem, the payloads never do.
+    with tempfile.TemporaryDirectory(prefix="ffmpeg-fifo-") as tmp:
+        paths = []
+        writers = []
+        for index, data in enumerate(payloads):
+            path = os.path.join(tmp, f"input-{index}")
+            os.mkfifo(path)
+            writer = threading.Thread(target=_feed_fifo, args=(path, data), daemon=True)
+            writer.start()
+            paths.append(path)
+            writers.append(writer)
+        try:
+            yield paths
+        finally:
+            for path, writer in zip(paths, writers):
+                if writer.is_alive():
+                    # The consumer exited without opening or draining this pipe:
+                    # attach a reader so the blocked writer wakes up and exits.
+                    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+                    os.close(fd)
+                writer.join(timeout=5)
+
+
+def _feed_stdin(stream, data: bytes):
+    try:
+        stream.write(data)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        try:
+            stream.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+
+def stream_pipe(cmd: list[str], input_bytes: Optional[bytes] = None, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    # Like run_pipe, but yields stdout while the process is still running so the
+    # caller can forward encoded audio before the encode has finished.
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if input_bytes is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stderr_chunks: list[bytes] = []
+    helpers = [threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)]
+    if input_bytes is not None:
+        helpers.append(threading.Thread(target=_feed_stdin, args=(proc.stdin, input_bytes), daemon=True))
+    for helper in helpers:
+        helper.start()
+
+    finished = False
+    try:
+        with control.tracked(proc):
+            while True:
+                chunk = proc.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            proc.wait()
+        for helper in helpers:
+            helper.join()
+        finished = True
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=b"".join(stderr_chunks))
+    finally:
+        if not finished:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
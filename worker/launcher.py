@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import time
+
+import redis
+from rq.utils import import_attribute
+from sqlalchemy import text
+
+import music_beds
+import pipeline_worker  # noqa: F401  preloaded so WORKER_CLASS can name it without a per-process import
+import queues
+import storage
+from config import settings
+from db import engine
+from providers import tts
+
+# Supervisor for long-lived worker processes. The parent imports the task code
+# and renders the music beds once, then forks WORKER_PROCESSES children. Each
+# child replaces the connections it must not share across fork (DB pool, boto3
+# client), warms them together with the TTS clients, and runs a non-forking
+# worker, so jobs start with everything hot. A child exits after
+# WORKER_MAX_JOBS jobs to bound memory growth and the parent starts a fresh
+# one. SIGTERM is forwarded to the children for a warm shutdown.
+
+log = logging.getLogger("launcher")
+
+# A child that dies sooner than this is treated as crashing and restarted with a delay.
+_MIN_LIFETIME_SEC = 10.0
+_RESTART_DELAY_SEC = 5.0
+
+
+def warm_process():
+    engine.dispose(close=False)
+    storage.reset_client()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        log.warning("Database warm-up failed", exc_info=True)
+    try:
+        storage.s3.head_bucket(Bucket=settings.s3_bucket)
+    except Exception:
+        log.warning("S3 warm-up failed", exc_info=True)
+    tts.warm_clients()
+
+
+def run_child():
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    warm_process()
+    connection = redis.from_url(settings.redis_url)
+    worker_class = import_attribute(settings.worker_class)
+    worker = worker_class(list(queues.QUEUE_WEIGHTS), connection=connection)
+    # The scheduler moves retries due after their backoff back onto the queues;
+    # RQ lets one process per queue set hold its lock.
+    worker.work(max_jobs=settings.worker_max_jobs or None, with_scheduler=True)
+
+
+def _spawn() -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_child()
+        except BaseException:
+            log.exception("Worker process failed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    music_beds.warm_music_beds()
+
+    children: dict[int, float] = {}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        # Ctrl+C already reaches the whole process group; a second signal would
+        # turn the children's warm shutdown into a cold one.
+        if signum != signal.SIGTERM:
+            return
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    while True:
+        while not stopping and len(children) < max(1, settings.worker_processes):
+            children[_spawn()] = time.monotonic()
+        if not children:
+            break
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        lifetime = time.monotonic() - started
+        log.info("Worker process %s exited with %s after %.0fs", pid, os.waitstatus_to_exitcode(status), lifetime)
+        if lifetime < _MIN_LIFETIME_SEC:
+            time.sleep(_RESTART_DELAY_SEC)
+
+
+if __name__ == "__main__":
+    main()
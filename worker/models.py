@@ -22,6 +22,11 @@ class AudioJob(Base):
     preset_voice_id: Mapped[str] = mapped_column(String(64), nullable=True)
     purchase_id: Mapped[str] = mapped_column(String(36), nullable=True)
     result_s3_key: Mapped[str] = mapped_column(String(255), nullable=True)
+    render_fingerprint: Mapped[str] = mapped_column(String(64), nullable=True)
+    dedup_of_job_id: Mapped[str] = mapped_column(String(36), nullable=True)
     error: Mapped[str] = mapped_column(Text, nullable=True)
+    # Last render stage with a stored checkpoint (tts, mix) and attempts started so far.
+    stage: Mapped[str] = mapped_column(String(16), nullable=True)
+    attempts: Mapped[int] = mapped_column(default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
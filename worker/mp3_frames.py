@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+# MPEG audio Layer III bitstream helpers: exact duration, frame-boundary trim and
+# pad, and concatenation without decoding. Only Layer III is handled; callers
+# fall back to ffmpeg when parse() raises ValueError.
+
+_BITRATES_KBPS = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    25: (11025, 12000, 8000),
+}
+_VERSION_BITS = {0: 25, 2: 2, 3: 1}
+_VERSION_CODES = {25: 0, 2: 2, 1: 3}
+_CHANNEL_MODE_MONO = 3
+
+
+@dataclass(frozen=True)
+class FrameFormat:
+    version: int
+    sample_rate: int
+    mono: bool
+
+    @property
+    def samples_per_frame(self) -> int:
+        return 1152 if self.version == 1 else 576
+
+    @property
+    def side_info_size(self) -> int:
+        if self.version == 1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+@dataclass
+class Mp3Stream:
+    format: FrameFormat
+    bitrate_kbps: int
+    frames: list[bytes]
+
+    @property
+    def duration_sec(self) -> float:
+        return len(self.frames) * self.format.samples_per_frame / self.format.sample_rate
+
+    def to_bytes(self) -> bytes:
+        return b"".join(self.frames)
+
+
+def _parse_header(data: bytes, offset: int) -> Optional[tuple[FrameFormat, int, int, bool]]:
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = _VERSION_BITS.get((b1 >> 3) & 0x03)
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    if version is None or layer_bits != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = _BITRATES_KBPS[1 if version == 1 else 2][bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    mono = (b3 >> 6) & 0x03 == _CHANNEL_MODE_MONO
+    has_crc = not (b1 & 0x01)
+    coefficient = 144 if version == 1 else 72
+    length = coefficient * bitrate * 1000 // sample_rate + padding
+    return FrameFormat(version=version, sample_rate=sample_rate, mono=mono), bitrate, length, has_crc
+
+
+def _skip_id3v2(data: bytes) -> int:
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_info_frame(frame: bytes, fmt: FrameFormat, has_crc: bool) -> bool:
+    offset = 4 + (2 if has_crc else 0) + fmt.side_info_size
+    return frame[offset : offset + 4] in (b"Xing", b"Info") or frame[36:40] == b"VBRI"
+
+
+def parse(data: bytes) -> Mp3Stream:
+    end = len(data) - 128 if len(data) >= 128 and data[-128:-125] == b"TAG" else len(data)
+    offset = _skip_id3v2(data)
+    frames: list[bytes] = []
+    stream_format = None
+    bitrate = 0
+
+    while offset < end:
+        header = _parse_header(data, offset)
+        if header is None or offset + header[2] > end:
+            if stream_format is None:
+                offset += 1
+                continue
+            break
+        fmt, frame_bitrate, length, has_crc = header
+        if stream_format is None:
+            # Accept the first sync only when the following frame also parses, to skip false syncs.
+            following = _parse_header(data, offset + length)
+            if offset + length < end and (following is None or following[0] != fmt):
+                offset += 1
+                continue
+            stream_format = fmt
+            bitrate = frame_bitrate
+            frame = data[offset : offset + length]
+            offset += length
+            if _is_info_frame(frame, fmt, has_crc):
+                continue
+            frames.append(frame)
+            continue
+        if fmt != stream_format:
+            raise ValueError("MP3 stream changes format mid-stream")
+        frames.append(data[offset : offset + length])
+        offset += length
+
+    if stream_format is None or not frames:
+        raise ValueError("No MPEG Layer III frames found")
+    return Mp3Stream(format=stream_format, bitrate_kbps=bitrate, frames=frames)
+
+
+def duration_sec(data: bytes) -> float:
+    return parse(data).duration_sec
+
+
+def silent_frames(fmt: FrameFormat, bitrate_kbps: int, count: int) -> list[bytes]:
+    # Zeroed side info (part2_3_length = 0, main_data_begin = 0) decodes to digital
+    # silence and never borrows from the bit reservoir. Padding bits follow the
+    # fractional frame size so the stream keeps its constant bitrate.
+    table = _BITRATES_KBPS[1 if fmt.version == 1 else 2]
+    bitrate_index = table.index(bitrate_kbps)
+    rate_index = _SAMPLE_RATES[fmt.version].index(fmt.sample_rate)
+    coefficient = 144 if fmt.version == 1 else 72
+    exact = coefficient * bitrate_kbps * 1000 / fmt.sample_rate
+    base = int(exact)
+    channel_bits = (_CHANNEL_MODE_MONO if fmt.mono else 0) << 6
+
+    frames = []
+    carry = 0.0
+    for _ in range(count):
+        carry += exact - base
+        padding = 1 if carry >= 1.0 else 0
+        carry -= padding
+        header = bytes(
+            (
+                0xFF,
+                0xE0 | (_VERSION_CODES[fmt.version] << 3) | (1 << 1) | 0x01,
+                (bitrate_index << 4) | (rate_index << 2) | (padding << 1),
+                channel_bits,
+            )
+        )
+        frames.append(header + bytes(base + padding - 4))
+    return frames
+
+
+def _frame_count(fmt: FrameFormat, seconds: float) -> int:
+    return int(math.ceil(max(0.0, seconds) * fmt.sample_rate / fmt.samples_per_frame))
+
+
+def silence(duration: float, sample_rate: int = 44100, mono: bool = False, bitrate_kbps: int = 32) -> bytes:
+    version = next(v for v, rates in _SAMPLE_RATES.items() if sample_rate in rates)
+    fmt = FrameFormat(version=version, sample_rate=sample_rate, mono=mono)
+    return b"".join(silent_frames(fmt, bitrate_kbps, _frame_count(fmt, duration)))
+
+
+def fit(data: bytes, duration: float) -> bytes:
+    # Trim or pad on frame boundaries; the result is within one frame (~26 ms) of the target.
+    stream = parse(data)
+    target = _frame_count(stream.format, duration)
+    frames = stream.frames[:target]
+    if len(frames) < target:
+        frames += silent_frames(stream.format, stream.bitrate_kbps, target - len(frames))
+    return b"".join(frames)
+
+
+def concat(segments: list[bytes], pause_sec: float = 0.0) -> Optional[bytes]:
+    # None when the segments do not share version, sample rate and channel count.
+    streams = [parse(segment) for segment in segments]
+    if not streams:
+        return None
+    fmt = streams[0].format
+    if any(stream.format != fmt for stream in streams):
+        return None
+
+    pause = silent_frames(fmt, streams[0].bitrate_kbps, _frame_count(fmt, pause_sec))
+    frames: list[bytes] = []
+    for index, stream in enumerate(streams):
+        if index:
+            frames.extend(pause)
+        frames.extend(stream.frames)
+    return b"".join(frames)
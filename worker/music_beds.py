@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import uuid
+
+from config import settings
+from storage import download_bytes, upload_bytes
+
+
+MUSIC_FILTERS = {
+    "calm-1": "0.014*sin(2*PI*174*t)+0.011*sin(2*PI*220*t)+0.007*sin(2*PI*261*t)",
+    "calm-2": "0.012*sin(2*PI*164*t)+0.010*sin(2*PI*207*t)+0.006*sin(2*PI*246*t)",
+    "calm-3": "0.013*sin(2*PI*196*t)+0.010*sin(2*PI*247*t)+0.006*sin(2*PI*294*t)",
+    "deep-1": "0.015*sin(2*PI*130*t)+0.010*sin(2*PI*165*t)+0.006*sin(2*PI*196*t)",
+}
+
+# Bump to invalidate every stored bed (e.g. when the render chain below changes).
+BED_FORMAT_VERSION = 1
+BED_SAMPLE_RATE = 44100
+BED_FILTER = "lowpass=f=1800"
+# All partials are whole-Hz sines, so any whole-second bed loops sample-exactly.
+BED_LOOP_SEC = 20
+# Rendered and dropped so the lowpass settles before the loop starts.
+BED_WARMUP_SEC = 1
+
+
+def resolve_track_id(track_id: str) -> str:
+    return track_id if track_id in MUSIC_FILTERS else "calm-1"
+
+
+def bed_version(track_id: str) -> str:
+    spec = {
+        "format": BED_FORMAT_VERSION,
+        "expr": MUSIC_FILTERS[resolve_track_id(track_id)],
+        "filter": BED_FILTER,
+        "rate": BED_SAMPLE_RATE,
+        "loop": BED_LOOP_SEC,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _bed_filename(track_id: str) -> str:
+    track_id = resolve_track_id(track_id)
+    return f"{track_id}-{bed_version(track_id)}.wav"
+
+
+def _render_bed(track_id: str, out_path: str):
+    expr = MUSIC_FILTERS[resolve_track_id(track_id)]
+    total = BED_LOOP_SEC + BED_WARMUP_SEC
+    subprocess.run(
+        [
+            settings.ffmpeg_path,
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"aevalsrc={expr}:s={BED_SAMPLE_RATE}:d={total}",
+            "-af",
+            f"{BED_FILTER},atrim=start={BED_WARMUP_SEC},asetpts=PTS-STARTPTS",
+            "-ar",
+            str(BED_SAMPLE_RATE),
+            "-ac",
+            "2",
+            "-c:a",
+            "pcm_s16le",
+            "-f",
+            "wav",
+            out_path,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+
+def _mirror_key(filename: str) -> str:
+    return f"{settings.music_bed_s3_prefix.strip('/')}/{filename}"
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale(track_id: str, keep: str):
+    for path in glob.glob(os.path.join(settings.music_bed_dir, f"{track_id}-*.wav")):
+        if os.path.basename(path) != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def ensure_bed(track_id: str) -> str:
+    filename = _bed_filename(track_id)
+    path = os.path.join(settings.music_bed_dir, filename)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(settings.music_bed_dir, exist_ok=True)
+
+    if settings.music_bed_s3_prefix:
+        try:
+            data = download_bytes(_mirror_key(filename))
+            if data:
+                _write_atomic(path, data)
+                return path
+        except Exception:
+            pass
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        _render_bed(track_id, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    if settings.music_bed_s3_prefix:
+        try:
+            with open(path, "rb") as file:
+                upload_bytes(_mirror_key(filename), file.read(), content_type="audio/wav")
+        except Exception:
+            pass
+
+    return path
+
+
+def warm_music_beds():
+    for track_id in MUSIC_FILTERS:
+        path = ensure_bed(track_id)
+        _remove_stale(track_id, keep=os.path.basename(path))
+
+
+if __name__ == "__main__":
+    warm_music_beds()
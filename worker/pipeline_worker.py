@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from rq.job import Job
+from rq.queue import Queue
+from rq.utils import utcnow
+from rq.worker import WorkerStatus
+
+import control
+from config import settings
+from queues import PROCESS_FUNC, WeightedWorker
+from tasks import audio
+
+# A non-forking worker that keeps several audio jobs in flight and runs their
+# stages on separate pools: TTS (network), render (ffmpeg/numpy, sized to the
+# CPU count) and upload (network). While job N is being mixed, job N+1 is
+# already waiting on its TTS provider. The dequeue loop blocks once
+# pipeline_max_jobs jobs are in flight, so queued work stays in Redis where
+# other workers can take it. RQ bookkeeping is unchanged: each job is prepared
+# with prepare_job_execution and finished through handle_job_success or
+# handle_job_failure, so the started/finished/failed registries, retries with
+# backoff and dependents behave as with the forking worker. Job timeouts are not enforced
+# here; signals only reach the main thread.
+
+STAGE_NAMES = ("tts", "render", "upload")
+
+
+class PipelineWorker(WeightedWorker):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        render_workers = settings.pipeline_render_workers or os.cpu_count() or 1
+        self._tts_pool = ThreadPoolExecutor(settings.pipeline_tts_workers, thread_name_prefix="stage-tts")
+        self._render_pool = ThreadPoolExecutor(render_workers, thread_name_prefix="stage-render")
+        self._upload_pool = ThreadPoolExecutor(settings.pipeline_upload_workers, thread_name_prefix="stage-upload")
+        self._stages = [
+            (self._tts_pool, audio.tts_stage),
+            (self._render_pool, audio.render_stage),
+            (self._upload_pool, audio.upload_stage),
+        ]
+        self._slots = threading.BoundedSemaphore(max(1, settings.pipeline_max_jobs))
+        self._bookkeeping = threading.Lock()
+        self._active: dict[str, Job] = {}
+        self._keepalive_started = False
+
+    def get_heartbeat_ttl(self, job: Job) -> int:
+        return self.job_monitoring_interval + 60
+
+    def execute_job(self, job: Job, queue: Queue):
+        if job.func_name != PROCESS_FUNC:
+            # Anything else runs inline, like SimpleWorker.
+            self.set_state(WorkerStatus.BUSY)
+            self.perform_job(job, queue)
+            self.set_state(WorkerStatus.IDLE if not self._active else WorkerStatus.BUSY)
+            return
+
+        self._start_keepalive()
+        while not self._slots.acquire(timeout=self.job_monitoring_interval):
+            self.heartbeat()
+
+        with self._bookkeeping:
+            self.prepare_job_execution(job, remove_from_intermediate_queue=len(self.queues) == 1)
+            job.started_at = utcnow()
+            self._active[job.id] = job
+            self.set_state(WorkerStatus.BUSY)
+        self._tts_pool.submit(self._start, job, queue)
+
+    def _start(self, job: Job, queue: Queue):
+        job_id = job.args[0]
+        try:
+            render = audio.start_render(job_id)
+        except Exception as exc:
+            exc_info = sys.exc_info()
+            try:
+                audio.fail_render(job_id, exc, retrying=audio.will_retry(job, exc))
+            finally:
+                self._finish(job, queue, exc_info)
+            return
+        if render is None:
+            self._finish(job, queue)
+            return
+        self._run_stage(job, queue, 0, render)
+
+    def _run_stage(self, job: Job, queue: Queue, index: int, render: audio.RenderJob):
+        _, stage = self._stages[index]
+        try:
+            with control.stage(render.id, STAGE_NAMES[index]):
+                stage(render)
+        except control.JobStopped as exc:
+            # Cancelled or overdue: recorded on the row, and a normal finish for RQ.
+            try:
+                audio.stop_render(render.id, exc)
+            finally:
+                self._finish(job, queue)
+            return
+        except Exception as exc:
+            exc_info = sys.exc_info()
+            try:
+                audio.fail_render(render.id, exc, retrying=audio.will_retry(job, exc))
+            finally:
+                self._finish(job, queue, exc_info)
+            return
+
+        if index + 1 == len(self._stages):
+            self._finish(job, queue)
+            return
+        pool, _ = self._stages[index + 1]
+        pool.submit(self._run_stage, job, queue, index + 1, render)
+
+    def _finish(self, job: Job, queue: Queue, exc_info=None):
+        job.ended_at = utcnow()
+        try:
+            with self._bookkeeping:
+                if exc_info is None:
+                    job._result = None
+                    self.handle_job_success(job=job, queue=queue, started_job_registry=queue.started_job_registry)
+                    self.log.info("%s: Job OK (%s)", job.origin, job.id)
+                else:
+                    exc_string = "".join(traceback.format_exception(*exc_info))
+                    self.handle_job_failure(
+                        job=job,
+                        queue=queue,
+                        started_job_registry=queue.started_job_registry,
+                        exc_string=exc_string,
+                    )
+                    self.handle_exception(job, *exc_info)
+                self._active.pop(job.id, None)
+                if not self._active:
+                    self.set_state(WorkerStatus.IDLE)
+        except Exception:
+            self.log.error("Bookkeeping for job %s failed", job.id, exc_info=True)
+        finally:
+            self._slots.release()
+
+    def _start_keepalive(self):
+        if self._keepalive_started:
+            return
+        self._keepalive_started = True
+        threading.Thread(target=self._keepalive, name="pipeline-heartbeat", daemon=True).start()
+
+    def _keepalive(self):
+        # The main thread may sit in a blocking dequeue for minutes; in-flight
+        # jobs must keep their StartedJobRegistry entries alive meanwhile.
+        while True:
+            time.sleep(self.job_monitoring_interval)
+            with self._bookkeeping:
+                jobs = list(self._active.values())
+            for job in jobs:
+                try:
+                    self.maintain_heartbeats(job)
+                except Exception:
+                    self.log.warning("Heartbeat for job %s failed", job.id, exc_info=True)
+
+    def teardown(self):
+        # Warm shutdown: jobs already taken from Redis run to the end.
+        while True:
+            with self._bookkeeping:
+                if not self._active:
+                    break
+            time.sleep(0.5)
+        for pool, _ in self._stages:
+            pool.shutdown(wait=True)
+        super().teardown()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+import redis
+
+from config import settings
+from redis_client import get_redis
+
+# Provider health shared through Redis: rq forks a fresh process per job, so
+# in-process counters would reset every job and never trip a breaker.
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+def _state_key(provider: str) -> str:
+    return f"tts:health:{provider}"
+
+
+def _samples_key(provider: str) -> str:
+    return f"tts:health:{provider}:samples"
+
+
+def _probe_key(provider: str) -> str:
+    return f"tts:health:{provider}:probe"
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _parse_samples(raw: list[bytes]) -> list[tuple[float, bool, bool]]:
+    samples = []
+    for item in raw:
+        try:
+            latency, ok, timeout = item.decode("utf-8").split(":")
+            samples.append((float(latency), ok == "1", timeout == "1"))
+        except ValueError:
+            continue
+    return samples
+
+
+def _snapshot(state: dict, raw_samples: list[bytes]) -> dict:
+    samples = _parse_samples(raw_samples)
+    ok_latencies = [latency for latency, ok, _ in samples if ok]
+    status = (state.get(b"state") or STATE_CLOSED.encode()).decode("utf-8")
+    opened_at = float(state.get(b"opened_at") or 0)
+    if status == STATE_OPEN and time.time() - opened_at >= settings.tts_breaker_open_sec:
+        status = STATE_HALF_OPEN
+    return {
+        "state": status,
+        "samples": len(samples),
+        "error_rate": (sum(1 for _, ok, _ in samples if not ok) / len(samples)) if samples else 0.0,
+        "timeouts": sum(1 for _, _, timeout in samples if timeout),
+        "latencies": ok_latencies,
+        "p50_sec": _percentile(ok_latencies, 0.5),
+        "p90_sec": _percentile(ok_latencies, 0.9),
+    }
+
+
+def _empty_snapshot() -> dict:
+    return _snapshot({}, [])
+
+
+def snapshots(providers: list[str]) -> dict[str, dict]:
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for provider in providers:
+            pipe.hgetall(_state_key(provider))
+            pipe.lrange(_samples_key(provider), 0, -1)
+        raw = pipe.execute()
+    except redis.RedisError:
+        return {provider: _empty_snapshot() for provider in providers}
+    return {provider: _snapshot(raw[2 * i], raw[2 * i + 1]) for i, provider in enumerate(providers)}
+
+
+def latency_percentile(snapshot: dict, q: float) -> Optional[float]:
+    return _percentile(snapshot["latencies"], q)
+
+
+def acquire(provider: str, snapshot: dict) -> bool:
+    # Closed: always. Open: short-circuit. Half-open: one probe at a time fleet-wide.
+    if snapshot["state"] == STATE_CLOSED:
+        return True
+    if snapshot["state"] == STATE_OPEN:
+        return False
+    try:
+        return bool(get_redis().set(_probe_key(provider), "1", nx=True, ex=max(1, int(settings.tts_http_timeout_sec))))
+    except redis.RedisError:
+        return True
+
+
+def record(provider: str, latency_sec: float, ok: bool, timeout: bool = False):
+    sample = f"{latency_sec:.3f}:{int(ok)}:{int(timeout)}"
+    try:
+        conn = get_redis()
+        pipe = conn.pipeline(transaction=False)
+        pipe.lpush(_samples_key(provider), sample)
+        pipe.ltrim(_samples_key(provider), 0, max(1, settings.tts_breaker_window) - 1)
+        if ok:
+            pipe.hget(_state_key(provider), "state")
+            pipe.hset(_state_key(provider), mapping={"state": STATE_CLOSED, "consecutive_failures": 0})
+            pipe.delete(_probe_key(provider))
+            previous = pipe.execute()[2]
+            if (previous or b"").decode("utf-8") == STATE_OPEN:
+                # A probe just closed the breaker. Keep only its sample, or the
+                # timeouts that opened it would trip it again on the next one.
+                conn.ltrim(_samples_key(provider), 0, 0)
+            return
+
+        pipe.hincrby(_state_key(provider), "consecutive_failures", 1)
+        pipe.hget(_state_key(provider), "state")
+        pipe.lrange(_samples_key(provider), 0, -1)
+        _, _, failures, state, raw_samples = pipe.execute()
+
+        recent_timeouts = sum(1 for _, _, timed_out in _parse_samples(raw_samples) if timed_out)
+        was_probing = (state or b"").decode("utf-8") == STATE_OPEN
+        if (
+            was_probing
+            or failures >= settings.tts_breaker_failures
+            or recent_timeouts >= settings.tts_breaker_timeouts
+        ):
+            pipe = conn.pipeline(transaction=False)
+            pipe.hset(_state_key(provider), mapping={"state": STATE_OPEN, "opened_at": time.time()})
+            pipe.delete(_probe_key(provider))
+            pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def _hedge_keys() -> tuple[str, str]:
+    window = int(time.time() // max(1, settings.tts_hedge_window_sec))
+    return f"tts:hedge:{window}:requests", f"tts:hedge:{window}:sent"
+
+
+def count_hedge_eligible():
+    requests_key, _ = _hedge_keys()
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incr(requests_key)
+        pipe.expire(requests_key, 2 * max(1, settings.tts_hedge_window_sec))
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def try_hedge() -> bool:
+    # Hedges stay within tts_hedge_budget of eligible requests in the current window.
+    requests_key, sent_key = _hedge_keys()
+    try:
+        conn = get_redis()
+        pipe = conn.pipeline(transaction=False)
+        pipe.get(requests_key)
+        pipe.incr(sent_key)
+        pipe.expire(sent_key, 2 * max(1, settings.tts_hedge_window_sec))
+        requests, sent, _ = pipe.execute()
+        if sent > settings.tts_hedge_budget * int(requests or 0):
+            conn.decr(sent_key)
+            return False
+        return True
+    except redis.RedisError:
+        return False
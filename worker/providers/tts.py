@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 import asyncio
-import os
+import atexit
+import importlib.util
+import re
 import shutil
-import subprocess
-import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Optional
 
-import edge_tts
 import httpx
+from studio_shared import edge_client
 
+import control
+import mp3_frames
+import segment_cache
+import wav_pcm
 from config import settings
+from ffmpeg_io import fifo_inputs, run_pipe
+from providers import health
 
 
 VOICE_PROVIDER_MAP = {
@@ -47,8 +56,75 @@ VOICE_PROVIDER_MAP = {
 }
 
 
-def _run(cmd: list[str]):
-    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+# Max characters per request; espeak is local and takes any length.
+PROVIDER_TEXT_LIMITS = {
+    "yandex": 4800,
+    "salute": 3800,
+    "edge": 3000,
+}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…;])\s+")
+_CLAUSE_END = re.compile(r"(?<=[,:—-])\s+")
+
+_provider_slots: dict[str, threading.BoundedSemaphore] = {}
+_provider_slots_lock = threading.Lock()
+
+
+def _provider_slot(provider: str) -> threading.BoundedSemaphore:
+    with _provider_slots_lock:
+        slot = _provider_slots.get(provider)
+        if slot is None:
+            limit = getattr(settings, f"tts_concurrency_{provider}", 2)
+            slot = threading.BoundedSemaphore(max(1, int(limit)))
+            _provider_slots[provider] = slot
+        return slot
+
+
+_http_clients: dict[str, httpx.Client] = {}
+_http_clients_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    return settings.tts_http2 and importlib.util.find_spec("h2") is not None
+
+
+def _http_client(provider: str) -> httpx.Client:
+    # One keep-alive pool per provider for the life of the process, so chunked
+    # synthesis pays DNS/TCP/TLS setup once rather than per request.
+    with _http_clients_lock:
+        client = _http_clients.get(provider)
+        if client is None:
+            client = httpx.Client(
+                timeout=httpx.Timeout(settings.tts_http_timeout_sec, connect=settings.tts_http_connect_timeout_sec),
+                limits=httpx.Limits(
+                    max_connections=settings.tts_http_max_connections,
+                    max_keepalive_connections=settings.tts_http_max_keepalive,
+                    keepalive_expiry=settings.tts_http_keepalive_expiry_sec,
+                ),
+                http2=_http2_enabled(),
+            )
+            _http_clients[provider] = client
+        return client
+
+
+def close_http_clients():
+    with _http_clients_lock:
+        clients = list(_http_clients.values())
+        _http_clients.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_http_clients)
+
+
+def warm_clients():
+    # For long-lived worker processes: open the keep-alive pools and the Edge
+    # loop up front so the first job does not pay for them.
+    for provider in _provider_order():
+        if provider in ("yandex", "salute") and _provider_configured(provider):
+            _http_client(provider)
+    edge_client.warm()
 
 
 def _pick_espeak() -> str:
@@ -73,7 +149,21 @@ def _voice_map(voice_id: Optional[str]) -> dict:
     }
 
 
-def _yandex_tts(text: str, voice_id: Optional[str] = None) -> bytes:
+def _post(provider: str, url: str, cancelled: Optional[threading.Event], **kwargs) -> bytes:
+    # Streamed, so a hedge that lost stops reading and its connection is closed
+    # instead of downloading the rest. Waiting for the response headers, where a
+    # TTS API spends most of its time, cannot be interrupted.
+    with _http_client(provider).stream("POST", url, **kwargs) as resp:
+        resp.raise_for_status()
+        chunks = []
+        for chunk in resp.iter_bytes():
+            if cancelled is not None and cancelled.is_set():
+                return b""
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+
+def _yandex_tts(text: str, voice_id: Optional[str] = None, cancelled: Optional[threading.Event] = None) -> bytes:
     if not settings.yandex_api_key:
         raise RuntimeError("YANDEX_API_KEY is not configured")
 
@@ -85,13 +175,10 @@ def _yandex_tts(text: str, voice_id: Optional[str] = None) -> bytes:
         "voice": mapped_voice,
         "format": settings.yandex_format,
     }
-    with httpx.Client(timeout=40.0) as client:
-        resp = client.post(settings.yandex_tts_url, headers=headers, data=data)
-        resp.raise_for_status()
-        return resp.content
+    return _post("yandex", settings.yandex_tts_url, cancelled, headers=headers, data=data)
 
 
-def _salute_tts(text: str, voice_id: Optional[str] = None) -> bytes:
+def _salute_tts(text: str, voice_id: Optional[str] = None, cancelled: Optional[threading.Event] = None) -> bytes:
     if not settings.salute_api_key:
         raise RuntimeError("SALUTE_API_KEY is not configured")
 
@@ -102,28 +189,18 @@ def _salute_tts(text: str, voice_id: Optional[str] = None) -> bytes:
         "lang": settings.salute_lang,
         "format": "mp3",
     }
-    with httpx.Client(timeout=40.0) as client:
-        resp = client.post(settings.salute_tts_url, headers=headers, json=payload)
-        resp.raise_for_status()
-        return resp.content
-
+    return _post("salute", settings.salute_tts_url, cancelled, headers=headers, json=payload)
 
-async def _edge_save_to_file(text: str, voice_name: str, rate: str, pitch: str, path: str):
-    communicate = edge_tts.Communicate(text=text, voice=voice_name, rate=rate, pitch=pitch)
-    await communicate.save(path)
 
-
-def _edge_tts(text: str, voice_id: Optional[str] = None) -> bytes:
+def _edge_tts(text: str, voice_id: Optional[str] = None, cancelled: Optional[threading.Event] = None) -> bytes:
     cfg = _voice_map(voice_id).get("edge", {})
     voice_name = cfg.get("voice") or ("ru-RU-SvetlanaNeural" if _contains_cyrillic(text) else "en-US-AriaNeural")
     rate = cfg.get("rate", "+0%")
     pitch = cfg.get("pitch", "+0Hz")
 
-    with tempfile.TemporaryDirectory(prefix="tts-edge-") as tmp:
-        out_path = os.path.join(tmp, "speech.mp3")
-        asyncio.run(_edge_save_to_file(text, voice_name, rate, pitch, out_path))
-        with open(out_path, "rb") as file:
-            return file.read()
+    return edge_client.synthesize(
+        text, voice_name, rate, pitch, timeout=settings.tts_http_timeout_sec, cancelled=cancelled
+    )
 
 
 def _espeak_tts(text: str, voice_id: Optional[str] = None) -> bytes:
@@ -134,54 +211,49 @@ def _espeak_tts(text: str, voice_id: Optional[str] = None) -> bytes:
         else:
             profile = {"voice": "en-us+f3", "speed": 150, "pitch": 52}
 
-    espeak_bin = _pick_espeak()
-    ffmpeg = settings.ffmpeg_path or os.getenv("FFMPEG_PATH", "ffmpeg")
-
-    with tempfile.TemporaryDirectory(prefix="tts-espeak-") as tmp:
-        wav_path = os.path.join(tmp, "speech.wav")
-        mp3_path = os.path.join(tmp, "speech.mp3")
-        _run(
-            [
-                espeak_bin,
-                "-v",
-                str(profile["voice"]),
-                "-s",
-                str(profile["speed"]),
-                "-p",
-                str(profile["pitch"]),
-                "-w",
-                wav_path,
-                text,
-            ]
-        )
-        _run(
-            [
-                ffmpeg,
-                "-y",
-                "-i",
-                wav_path,
-                "-ar",
-                "44100",
-                "-ac",
-                "2",
-                "-c:a",
-                "libmp3lame",
-                "-b:a",
-                "192k",
-                mp3_path,
-            ]
-        )
-        with open(mp3_path, "rb") as file:
-            return file.read()
-
-
-def _synthesize_by_provider(provider: str, text: str, voice_id: Optional[str]) -> bytes:
+    # espeak's own WAV goes straight to the mixer, which decodes PCM anyway; no MP3 round trip.
+    wav = run_pipe(
+        [
+            _pick_espeak(),
+            "-v",
+            str(profile["voice"]),
+            "-s",
+            str(profile["speed"]),
+            "-p",
+            str(profile["pitch"]),
+            "--stdout",
+            text,
+        ]
+    )
+    return wav_pcm.parse(wav).to_bytes()
+
+
+def _synthesize_by_provider(
+    provider: str,
+    text: str,
+    voice_id: Optional[str],
+    cancelled: Optional[threading.Event] = None,
+) -> bytes:
+    with _provider_slot(provider):
+        # A hedge that lost while still waiting for a slot never reaches the provider.
+        if cancelled is not None and cancelled.is_set():
+            return b""
+        return _call_provider(provider, text, voice_id, cancelled)
+
+
+def _call_provider(
+    provider: str,
+    text: str,
+    voice_id: Optional[str],
+    cancelled: Optional[threading.Event] = None,
+) -> bytes:
+    # Network providers return b"" once `cancelled` is set; espeak runs to the end.
     if provider == "yandex":
-        return _yandex_tts(text, voice_id=voice_id)
+        return _yandex_tts(text, voice_id=voice_id, cancelled=cancelled)
     if provider == "salute":
-        return _salute_tts(text, voice_id=voice_id)
+        return _salute_tts(text, voice_id=voice_id, cancelled=cancelled)
     if provider == "edge":
-        return _edge_tts(text, voice_id=voice_id)
+        return _edge_tts(text, voice_id=voice_id, cancelled=cancelled)
     if provider == "espeak":
         return _espeak_tts(text, voice_id=voice_id)
     raise RuntimeError(f"Unsupported TTS provider: {provider}")
@@ -192,10 +264,7 @@ def synthesize(text: str, voice_id: Optional[str] = None) -> bytes:
     return _synthesize_by_provider(provider, text, voice_id)
 
 
-def synthesize_with_fallback(text: str, voice_id: Optional[str] = None) -> Optional[bytes]:
-    if not text.strip():
-        return None
-
+def _provider_order() -> list[str]:
     provider = settings.tts_provider.lower()
     order = [provider]
 
@@ -210,16 +279,322 @@ def synthesize_with_fallback(text: str, voice_id: Optional[str] = None) -> Optio
     else:
         order.extend(["yandex", "edge", "espeak"])
 
-    seen = set()
-    for name in order:
-        if name in seen:
-            continue
-        seen.add(name)
-        try:
-            audio = _synthesize_by_provider(name, text, voice_id)
-            if audio:
-                return audio
-        except Exception:
+    return list(dict.fromkeys(order))
+
+
+def _provider_configured(provider: str) -> bool:
+    if provider == "yandex":
+        return bool(settings.yandex_api_key)
+    if provider == "salute":
+        return bool(settings.salute_api_key)
+    return True
+
+
+def _is_timeout(exc: Exception) -> bool:
+    return isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError, TimeoutError))
+
+
+def _route(order: list[str], snapshots: dict[str, dict]) -> list[str]:
+    # Open providers sink to the back; the rest go fastest p50 first, and
+    # latencies within one bucket keep the configured preference. Half-open
+    # ranks with closed so its single probe actually gets sent. espeak is the
+    # offline last resort and always stays at the end however fast it is.
+    rank = {health.STATE_CLOSED: 0, health.STATE_HALF_OPEN: 0, health.STATE_OPEN: 1}
+    bucket = max(0.001, settings.tts_routing_bucket_ms / 1000.0)
+
+    def key(item: tuple[int, str]):
+        index, name = item
+        snap = snapshots[name]
+        p50 = snap["p50_sec"]
+        return rank.get(snap["state"], 0), int(p50 / bucket) if p50 is not None else 0, index
+
+    network = [item for item in enumerate(order) if item[1] != "espeak"]
+    routed = [name for _, name in sorted(network, key=key)]
+    return routed + [name for name in order if name == "espeak"]
+
+
+def _attempt_order() -> tuple[list[str], dict[str, dict]]:
+    # Providers without credentials are dropped up front instead of failing per job.
+    order = [name for name in _provider_order() if _provider_configured(name)]
+    snapshots = health.snapshots(order)
+    if settings.tts_latency_routing:
+        order = _route(order, snapshots)
+    return order, snapshots
+
+
+def _attempt(
+    name: str,
+    text: str,
+    voice_id: Optional[str],
+    cancelled: Optional[threading.Event] = None,
+) -> Optional[bytes]:
+    started = time.monotonic()
+    try:
+        audio = _synthesize_by_provider(name, text, voice_id, cancelled)
+    except Exception as exc:
+        if cancelled is not None and cancelled.is_set():
+            # Lost the race; how the abandoned request ended says nothing about the provider.
+            return None
+        health.record(name, time.monotonic() - started, ok=False, timeout=_is_timeout(exc))
+        return None
+    if not audio and cancelled is not None and cancelled.is_set():
+        return None
+    health.record(name, time.monotonic() - started, ok=bool(audio))
+    return audio or None
+
+
+def _synthesize_first(text: str, voice_id: Optional[str]) -> Optional[tuple[str, bytes]]:
+    order, snapshots = _attempt_order()
+    for index, name in enumerate(order):
+        # Open circuits are skipped; the final provider is always tried so a
+        # job never fails on breaker state alone.
+        if index < len(order) - 1 and not health.acquire(name, snapshots[name]):
             continue
+        audio = _attempt(name, text, voice_id)
+        if audio:
+            return name, audio
+
+    return None
 
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=max(2, 2 * settings.tts_parallel_chunks),
+                thread_name_prefix="tts-hedge",
+            )
+        return _hedge_executor
+
+
+def _next_allowed(remaining: list[str], snapshots: dict[str, dict], network_only: bool = False) -> Optional[str]:
+    while remaining:
+        if network_only and remaining[0] == "espeak":
+            return None
+        name = remaining.pop(0)
+        if not remaining or health.acquire(name, snapshots[name]):
+            return name
     return None
+
+
+def _hedge_delay(snapshot: dict) -> Optional[float]:
+    if snapshot["samples"] < settings.tts_hedge_min_samples:
+        return None
+    return health.latency_percentile(snapshot, settings.tts_hedge_percentile)
+
+
+def _synthesize_hedged(text: str, voice_id: Optional[str]) -> Optional[tuple[str, bytes]]:
+    # Same walk as _synthesize_first, but when the current provider runs past its
+    # observed latency percentile a second network provider is raced against it.
+    # The first usable result wins. The loser is cancelled: skipped if still
+    # waiting for a slot, otherwise its Edge request or HTTP download is abandoned.
+    order, snapshots = _attempt_order()
+    remaining = list(order)
+    health.count_hedge_eligible()
+
+    while remaining:
+        primary = _next_allowed(remaining, snapshots)
+        if primary is None:
+            break
+        cancelled = threading.Event()
+        futures = {_hedge_pool().submit(control.bind(_attempt), primary, text, voice_id, cancelled): primary}
+        done, pending = wait(futures, timeout=_hedge_delay(snapshots[primary]))
+        if pending and remaining and remaining[0] != "espeak" and health.try_hedge():
+            backup = _next_allowed(remaining, snapshots, network_only=True)
+            if backup:
+                futures[_hedge_pool().submit(control.bind(_attempt), backup, text, voice_id, cancelled)] = backup
+                pending = set(futures) - done
+
+        finished = list(done)
+        while True:
+            for future in finished:
+                audio = future.result()
+                if audio:
+                    cancelled.set()
+                    return futures[future], audio
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    return None
+
+
+def synthesize_with_fallback(text: str, voice_id: Optional[str] = None) -> Optional[bytes]:
+    if not text.strip():
+        return None
+
+    result = _synthesize_first(text, voice_id)
+    return result[1] if result else None
+
+
+def _voice_params(provider: str, voice_id: Optional[str]):
+    # Everything besides the text that changes a provider's output for this voice.
+    mapped = _voice_map(voice_id)
+    if provider == "yandex":
+        return {
+            "voice": mapped.get("yandex") or settings.yandex_voice,
+            "lang": settings.yandex_lang,
+            "format": settings.yandex_format,
+        }
+    if provider == "salute":
+        return {"voice": settings.salute_voice, "lang": settings.salute_lang}
+    return mapped.get(provider)
+
+
+def _join_segments(segments: list[bytes], pause_ms: int) -> bytes:
+    if len(segments) == 1:
+        return segments[0]
+
+    pause_sec = max(0, pause_ms) / 1000.0
+    concat = wav_pcm.concat if all(wav_pcm.is_wav(segment) for segment in segments) else mp3_frames.concat
+    try:
+        joined = concat(segments, pause_sec)
+        if joined:
+            return joined
+    except ValueError:
+        pass
+
+    chains = []
+    for index in range(len(segments)):
+        pad = f",apad=pad_dur={pause_sec}" if index < len(segments) - 1 and pause_sec else ""
+        chains.append(f"[{index}:a]aresample=44100,aformat=channel_layouts=stereo{pad}[s{index}]")
+    labels = "".join(f"[s{index}]" for index in range(len(segments)))
+    graph = ";".join(chains) + f";{labels}concat=n={len(segments)}:v=0:a=1[out]"
+
+    with fifo_inputs(*segments) as paths:
+        inputs = [arg for path in paths for arg in ("-i", path)]
+        return run_pipe(
+            [
+                settings.ffmpeg_path,
+                *inputs,
+                "-filter_complex",
+                graph,
+                "-map",
+                "[out]",
+                "-c:a",
+                "libmp3lame",
+                "-b:a",
+                "192k",
+                "-f",
+                "mp3",
+                "pipe:1",
+            ]
+        )
+
+
+def _split_long(piece: str, limit: int) -> list[str]:
+    # Last resort for a single sentence over the limit: clause breaks, then words.
+    parts = []
+    for pattern in (_CLAUSE_END, re.compile(r"\s+")):
+        parts = _pack(pattern.split(piece), limit)
+        if all(len(part) <= limit for part in parts):
+            return parts
+    return [piece[i : i + limit] for i in range(0, len(piece), limit)]
+
+
+def _pack(pieces: list[str], limit: int) -> list[str]:
+    # Greedy packing that keeps line breaks between pieces that had them.
+    chunks: list[str] = []
+    current = ""
+    for piece in (p.strip(" \t") for p in pieces):
+        if not piece.strip():
+            continue
+        joiner = "" if not current or current.endswith("\n") else " "
+        candidate = f"{current}{joiner}{piece}"
+        if len(candidate.strip()) <= limit:
+            current = candidate
+            continue
+        if current.strip():
+            chunks.append(current.strip())
+        current = piece
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def split_text(text: str, limit: int) -> list[str]:
+    # Sentence-aligned chunks of at most `limit` characters, in reading order.
+    pieces = []
+    for line in text.splitlines():
+        sentences = [sentence for sentence in _SENTENCE_END.split(line) if sentence.strip()]
+        if sentences:
+            sentences[-1] += "\n"
+            pieces.extend(sentences)
+
+    chunks = []
+    for chunk in _pack(pieces, limit):
+        chunks.extend(_split_long(chunk, limit) if len(chunk) > limit else [chunk])
+    return chunks
+
+
+def _chunk_limit() -> int:
+    limits = [PROVIDER_TEXT_LIMITS[name] for name in _provider_order() if name in PROVIDER_TEXT_LIMITS]
+    return max(1, min(limits + [settings.tts_chunk_chars]))
+
+
+def _cache_providers() -> list[str]:
+    # Only the preferred provider that is not tripped is looked up, so a line a
+    # fallback synthesized during an outage stops being served once the primary
+    # recovers. With every breaker open any cached segment beats espeak.
+    names = [name for name in _provider_order() if name != "espeak" and _provider_configured(name)]
+    snapshots = health.snapshots(names)
+    for name in names:
+        if snapshots[name]["state"] != health.STATE_OPEN:
+            return [name]
+    return names
+
+
+def _synthesize_unit(text: str, voice_id: Optional[str], use_cache: bool, hedge: bool = False) -> Optional[bytes]:
+    # Segment cache is keyed by (provider, voice parameters, normalized text), so
+    # unchanged lines of an edited text are not re-synthesized.
+    control.check()
+    if use_cache:
+        keys = [segment_cache.segment_key(name, _voice_params(name, voice_id), text) for name in _cache_providers()]
+        audio = segment_cache.lookup(keys)
+        if audio:
+            return audio
+
+    hedged = hedge and settings.tts_hedge_enabled
+    result = _synthesize_hedged(text, voice_id) if hedged else _synthesize_first(text, voice_id)
+    if not result:
+        return None
+    name, audio = result
+    # espeak is local and cheap, so its output is never stored.
+    if use_cache and name != "espeak":
+        segment_cache.put(segment_cache.segment_key(name, _voice_params(name, voice_id), text), audio)
+    return audio
+
+
+def synthesize_text(text: str, voice_id: Optional[str] = None, hedge: bool = False) -> Optional[bytes]:
+    # Lines (when the segment cache is on) are split into provider-sized chunks,
+    # synthesized concurrently and reassembled in order; per-provider slots cap
+    # how many requests each provider sees at once.
+    use_cache = settings.tts_segment_cache_enabled
+    groups = segment_cache.split_lines(text) if use_cache else [text.strip()]
+    limit = _chunk_limit()
+    groups = [split_text(group, limit) for group in groups if group]
+    units = [unit for group in groups for unit in group]
+    if not units:
+        return None
+
+    if len(units) == 1:
+        results = [_synthesize_unit(units[0], voice_id, use_cache, hedge)]
+    else:
+        workers = min(len(units), max(1, settings.tts_parallel_chunks))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-chunk") as pool:
+            synthesize_unit = control.bind(_synthesize_unit)
+            results = list(pool.map(lambda unit: synthesize_unit(unit, voice_id, use_cache, hedge), units))
+    if any(audio is None for audio in results):
+        return None
+
+    segments = []
+    position = 0
+    for group in groups:
+        segments.append(_join_segments(results[position : position + len(group)], 0))
+        position += len(group)
+    return _join_segments(segments, settings.tts_segment_pause_ms if use_cache else 0)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+import random
+
+import redis
+from rq import Queue, Retry, SimpleWorker, Worker
+from studio_shared.queues import (  # noqa: F401  re-exported for the worker modules
+    DEMO,
+    DEMO_BULK,
+    LEGACY,
+    PAID,
+    PAID_BULK,
+    PROCESS_FUNC,
+    QUEUE_WEIGHTS,
+    TIMINGS_KEY,
+)
+
+from config import settings
+from redis_client import get_queue_redis, get_redis
+
+# Queue names and weights come from studio_shared.queues. WeightedWorker
+# reorders its queues after every job by a weighted random draw.
+
+TIMINGS_KEEP = 50
+# Headroom past the summed stage deadlines for start, completion and the DB writes around them.
+JOB_TIMEOUT_MARGIN_SEC = 60
+
+
+def weighted_order(names: list[str]) -> list[str]:
+    # Efraimidis-Spirakis: sorting by u ** (1 / w) draws without replacement in proportion to weight.
+    return sorted(names, key=lambda name: random.random() ** (1.0 / QUEUE_WEIGHTS.get(name, 1)), reverse=True)
+
+
+class WeightedWorker(Worker):
+    def reorder_queues(self, reference_queue):
+        by_name = {queue.name: queue for queue in self._ordered_queues}
+        self._ordered_queues = [by_name[name] for name in weighted_order(list(by_name))]
+
+
+class InlineWorker(WeightedWorker, SimpleWorker):
+    # Runs each job in the worker process itself instead of a forked child; used
+    # by launcher.py, whose processes keep their warm clients between jobs.
+    pass
+
+
+def record_timing(job_class: str, tts_sec: float, render_sec: float):
+    # Recent stage timings per job class feed the API's wait estimate.
+    key = TIMINGS_KEY.format(job_class=job_class)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.lpush(key, json.dumps({"tts": round(tts_sec, 3), "render": round(render_sec, 3)}))
+        pipe.ltrim(key, 0, TIMINGS_KEEP - 1)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def job_timeout_sec() -> int:
+    # RQ's hard limit per attempt, above the stage deadlines so those fire first
+    # and the job is stopped and refunded; the API's JOB_TIMEOUT_SEC matches it.
+    return (
+        settings.stage_deadline_tts_sec
+        + settings.stage_deadline_render_sec
+        + settings.stage_deadline_upload_sec
+        + JOB_TIMEOUT_MARGIN_SEC
+    )
+
+
+def enqueue_render(job_id: str, queue_name: str):
+    # Same shape as the API's worker_client.enqueue_audio_job: the RQ id is the
+    # AudioJob id and retries back off exponentially.
+    retry = None
+    if settings.job_max_retries > 0:
+        intervals = [settings.job_retry_base_sec * 2**attempt for attempt in range(settings.job_max_retries)]
+        retry = Retry(max=settings.job_max_retries, interval=intervals)
+    queue = Queue(queue_name, connection=get_queue_redis())
+    queue.enqueue(PROCESS_FUNC, job_id, job_id=job_id, retry=retry, job_timeout=job_timeout_sec())
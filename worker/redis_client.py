@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import redis
+
+from config import settings
+
+# Short socket timeouts: these connections carry best-effort bookkeeping
+# (provider health, cache metrics) that must never stall a render.
+_redis: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+    return _redis
+
+
+_queue_redis: Optional[redis.Redis] = None
+
+
+def get_queue_redis() -> redis.Redis:
+    # For enqueueing jobs, which must not give up after the short timeouts above.
+    global _queue_redis
+    if _queue_redis is None:
+        _queue_redis = redis.from_url(settings.redis_url)
+    return _queue_redis
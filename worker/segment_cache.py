@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from studio_shared.segment_cache import SegmentCache
+from studio_shared.segment_keys import normalize_line, segment_key  # noqa: F401  segment_key re-exported
+
+from config import settings
+from redis_client import get_redis
+from storage import download_bytes, upload_bytes
+
+_cache = SegmentCache(
+    cache_dir=settings.tts_segment_cache_dir,
+    max_mb=settings.tts_cache_max_mb,
+    idle_days=settings.tts_cache_idle_days,
+    sweep_sec=settings.tts_cache_sweep_sec,
+    s3_prefix=settings.tts_cache_s3_prefix,
+    download=download_bytes,
+    upload=upload_bytes,
+    redis=get_redis,
+)
+
+lookup = _cache.lookup
+get = _cache.get
+put = _cache.put
+sweep = _cache.sweep
+
+
+def split_lines(text: str) -> list[str]:
+    return [line for line in (normalize_line(raw) for raw in text.splitlines()) if line]
@@ -1,16 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
 import boto3
 from botocore.client import Config
 from config import settings
 
-s3 = boto3.client(
-    "s3",
-    endpoint_url=settings.s3_endpoint,
-    aws_access_key_id=settings.s3_access_key,
-    aws_secret_access_key=settings.s3_secret_key,
-    region_name=settings.s3_region,
-    config=Config(signature_version="s3v4"),
-)
+
+def _make_client():
+    return boto3.client(
+        "s3",
+        endpoint_url=settings.s3_endpoint,
+        aws_access_key_id=settings.s3_access_key,
+        aws_secret_access_key=settings.s3_secret_key,
+        region_name=settings.s3_region,
+        config=Config(signature_version="s3v4"),
+    )
+
+
+s3 = _make_client()
+
+
+def reset_client():
+    # boto3 clients are not fork-safe; a forked worker process builds its own.
+    global s3
+    s3 = _make_client()
 
 
 def upload_bytes(key: str, data: bytes, content_type: str = "audio/mpeg"):
     s3.put_object(Bucket=settings.s3_bucket, Key=key, Body=data, ContentType=content_type)
+
+
+def download_bytes(key: str) -> bytes:
+    obj = s3.get_object(Bucket=settings.s3_bucket, Key=key)
+    body = obj.get("Body")
+    return body.read() if body else b""
+
+
+def copy_key(src_key: str, dest_key: str):
+    s3.copy_object(
+        Bucket=settings.s3_bucket,
+        Key=dest_key,
+        CopySource={"Bucket": settings.s3_bucket, "Key": src_key},
+    )
+
+
+def upload_stream(key: str, chunks: Iterable[bytes], content_type: str = "audio/mpeg"):
+    # Multipart upload fed while the producer is still running. Parts upload on a
+    # small pool so the encoder keeps going; memory stays at roughly
+    # part_size * (concurrency + 1). Output smaller than one part falls back to
+    # a single put_object.
+    part_size = max(5, settings.s3_multipart_part_mb) * 1024 * 1024
+    concurrency = max(1, settings.s3_upload_concurrency)
+    buffer = bytearray()
+    upload_id = None
+    pending = []
+    parts = []
+
+    def _upload_part(number: int, body: bytes) -> dict:
+        resp = s3.upload_part(
+            Bucket=settings.s3_bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=body,
+        )
+        return {"PartNumber": number, "ETag": resp["ETag"]}
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-part") as pool:
+        try:
+            for chunk in chunks:
+                buffer.extend(chunk)
+                while len(buffer) >= part_size:
+                    if upload_id is None:
+                        upload_id = s3.create_multipart_upload(
+                            Bucket=settings.s3_bucket,
+                            Key=key,
+                            ContentType=content_type,
+                        )["UploadId"]
+                    body = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    if len(pending) >= concurrency:
+                        parts.append(pending.pop(0).result())
+                    pending.append(pool.submit(_upload_part, len(parts) + len(pending) + 1, body))
+
+            if upload_id is None:
+                upload_bytes(key, bytes(buffer), content_type=content_type)
+                return
+
+            if buffer:
+                pending.append(pool.submit(_upload_part, len(parts) + len(pending) + 1, bytes(buffer)))
+            parts.extend(future.result() for future in pending)
+            s3.complete_multipart_upload(
+                Bucket=settings.s3_bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            if upload_id is not None:
+                try:
+                    s3.abort_multipart_upload(Bucket=settings.s3_bucket, Key=key, UploadId=upload_id)
+                except Exception:
+                    pass
+            raise
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+
+def delete_prefix(prefix: str):
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=settings.s3_bucket, Prefix=prefix):
+        objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+        if objects:
+            s3.delete_objects(Bucket=settings.s3_bucket, Delete={"Objects": objects, "Quiet": True})
@@ -1,104 +1,348 @@
 from __future__ import annotations
 
-import os
 import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import IO, Iterator, Optional
 
+import httpx
+import redis
+from botocore.exceptions import BotoCoreError, ClientError
+from rq import get_current_job
+from rq.job import Job
+from rq.timeouts import JobTimeoutException
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
+from studio_shared.billing import refund_job_purchase
 
-from audio_engine import mix_and_master_mp3
+import checkpoints
+import control
+import events
+import mp3_frames
+import queues
+from audio_engine import render_stream
 from config import settings
 from db import SessionLocal
 from models import AudioJob
-from providers.tts import synthesize_with_fallback
-from storage import upload_bytes
+from providers.tts import synthesize_text
+from storage import copy_key, upload_stream
 
 
+DEMO_DURATION_SEC = 30
+
 VOICE_DEFAULTS = {
     "system_voice": "jane",
     "my_voice": "jane",  # MVP fallback: reuse high-quality preset voice if cloning provider is absent.
 }
 
 
+@dataclass
+class RenderJob:
+    # What the stages need from the AudioJob row, plus the artifacts passed between them.
+    id: str
+    text: str
+    voice_id: str
+    music_track_id: str
+    duration_sec: int
+    # Last stage with a stored checkpoint, as recorded on the row when the attempt started.
+    stage: Optional[str] = None
+    voice: Optional[bytes] = None
+    # Encoded MP3 between the render and upload stages; see render_stage.
+    output: Optional[IO[bytes]] = None
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def result_key(self) -> str:
+        return f"results/{self.id}.mp3"
+
+
 def _make_silence_mp3(duration_sec: int = 8) -> bytes:
-    tmp_wav = "/tmp/voice.wav"
-    tmp_mp3 = "/tmp/voice.mp3"
-    ffmpeg = settings.ffmpeg_path or os.getenv("FFMPEG_PATH", "ffmpeg")
-
-    subprocess.run(
-        [
-            ffmpeg,
-            "-y",
-            "-f",
-            "lavfi",
-            "-i",
-            "anullsrc=r=44100:cl=stereo",
-            "-t",
-            str(duration_sec),
-            tmp_wav,
-        ],
-        check=True,
+    return mp3_frames.silence(duration_sec)
+
+
+def _complete_followers(db: Session, job: AudioJob):
+    # Jobs with the same render fingerprint that attached to this render instead of enqueueing.
+    followers = (
+        db.query(AudioJob)
+        .filter(AudioJob.dedup_of_job_id == job.id)
+        .filter(AudioJob.status == "queued")
+        .all()
     )
-    subprocess.run(
-        [
-            ffmpeg,
-            "-y",
-            "-i",
-            tmp_wav,
-            "-codec:a",
-            "libmp3lame",
-            "-qscale:a",
-            "4",
-            tmp_mp3,
-        ],
-        check=True,
+    for follower in followers:
+        key = f"results/{follower.id}.mp3"
+        try:
+            copy_key(job.result_s3_key, key)
+        except Exception:
+            continue
+        follower.status = "completed"
+        follower.result_s3_key = key
+        follower.updated_at = datetime.utcnow()
+        db.commit()
+        events.publish(follower.id, "completed", stage="done", progress=1.0)
+
+
+def _release_followers(db: Session, job: AudioJob):
+    # The render ended without a result (failed, expired or cancelled): jobs that
+    # attached to it are detached and queued as renders of their own.
+    followers = (
+        db.query(AudioJob)
+        .filter(AudioJob.dedup_of_job_id == job.id)
+        .filter(AudioJob.status == "queued")
+        .all()
     )
+    for follower in followers:
+        queue_name = queues.DEMO if follower.duration_sec == DEMO_DURATION_SEC else queues.PAID
+        try:
+            queues.enqueue_render(follower.id, queue_name)
+        except redis.RedisError as exc:
+            follower.status = "failed"
+            follower.error = f"Could not queue render: {exc}"
+        follower.dedup_of_job_id = None
+        follower.updated_at = datetime.utcnow()
+        db.commit()
+        if follower.status == "failed":
+            events.publish(follower.id, "failed", error=follower.error)
 
-    with open(tmp_mp3, "rb") as file:
-        return file.read()
 
+def _set_stage(job_id: str, stage: str):
+    db: Session = SessionLocal()
+    try:
+        db.query(AudioJob).filter(AudioJob.id == job_id).update(
+            {"stage": stage, "updated_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
 
-def process_audio_job(job_id: str):
+
+def start_render(job_id: str) -> Optional[RenderJob]:
     db: Session = SessionLocal()
-    job = None
     try:
         job = db.query(AudioJob).filter(AudioJob.id == job_id).first()
-        if not job:
-            return
+        if not job or job.status in ("completed", "cancelled"):
+            return None
 
         job.status = "processing"
+        job.attempts = (job.attempts or 0) + 1
         job.updated_at = datetime.utcnow()
         db.commit()
+        events.publish(job.id, "processing", stage=job.stage or "tts", progress=0.5 if job.stage else 0.0)
 
         if job.voice_mode == "system_voice":
             selected_voice = job.preset_voice_id or VOICE_DEFAULTS["system_voice"]
         else:
             selected_voice = VOICE_DEFAULTS["my_voice"]
 
-        tts_audio = synthesize_with_fallback(job.input_text, voice_id=selected_voice)
-        if not tts_audio:
-            tts_audio = _make_silence_mp3()
-
-        duration_sec = max(30, int(job.duration_sec or 30))
-        final_audio = mix_and_master_mp3(
-            voice_bytes=tts_audio,
+        return RenderJob(
+            id=job.id,
+            text=job.input_text,
+            voice_id=selected_voice,
             music_track_id=job.music_track_id,
-            target_duration_sec=duration_sec,
+            duration_sec=max(DEMO_DURATION_SEC, int(job.duration_sec or DEMO_DURATION_SEC)),
+            stage=job.stage,
         )
+    finally:
+        db.close()
+
 
-        key = f"results/{job.id}.mp3"
-        upload_bytes(key, final_audio, content_type="audio/mpeg")
+def tts_stage(render: RenderJob) -> RenderJob:
+    if render.stage == checkpoints.STAGE_MIX:
+        return render
+    if render.stage == checkpoints.STAGE_TTS:
+        render.voice = checkpoints.load(render.id, "voice")
+        if render.voice:
+            return render
 
+    started = time.monotonic()
+    # Demo renders are interactive, so they get hedged TTS for a shorter tail.
+    render.voice = synthesize_text(
+        render.text,
+        voice_id=render.voice_id,
+        hedge=render.duration_sec == DEMO_DURATION_SEC,
+    )
+    if not render.voice:
+        render.voice = _make_silence_mp3()
+    render.timings["tts"] = time.monotonic() - started
+    if checkpoints.save(render.id, "voice", render.voice):
+        _set_stage(render.id, checkpoints.STAGE_TTS)
+        render.stage = checkpoints.STAGE_TTS
+    events.publish(render.id, "processing", stage="render", progress=0.5)
+    return render
+
+
+def render_stage(render: RenderJob) -> RenderJob:
+    if render.stage == checkpoints.STAGE_MIX:
+        return render
+    started = time.monotonic()
+    # Spooled rather than joined: at most one multipart part per job waiting for
+    # the upload pool stays in memory, the rest of the MP3 goes to a temp file.
+    spool = tempfile.SpooledTemporaryFile(max_size=max(5, settings.s3_multipart_part_mb) * 1024 * 1024)
+    try:
+        for chunk in render_stream(
+            voice_bytes=render.voice,
+            music_track_id=render.music_track_id,
+            target_duration_sec=render.duration_sec,
+        ):
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    render.output = spool
+    render.voice = None
+    render.timings["render"] = time.monotonic() - started
+    return render
+
+
+def _read_chunks(file: IO[bytes], size: int = 1024 * 1024) -> Iterator[bytes]:
+    return iter(lambda: file.read(size), b"")
+
+
+def upload_stage(render: RenderJob) -> RenderJob:
+    if render.stage != checkpoints.STAGE_MIX:
+        started = time.monotonic()
+        try:
+            upload_stream(render.result_key, _read_chunks(render.output), content_type="audio/mpeg")
+        finally:
+            render.output.close()
+            render.output = None
+        render.timings["render"] = render.timings.get("render", 0.0) + time.monotonic() - started
+        _set_stage(render.id, checkpoints.STAGE_MIX)
+        render.stage = checkpoints.STAGE_MIX
+    complete_render(render)
+    return render
+
+
+def complete_render(render: RenderJob):
+    if render.timings:
+        queues.record_timing(
+            "demo" if render.duration_sec == DEMO_DURATION_SEC else "paid",
+            tts_sec=render.timings.get("tts", 0.0),
+            render_sec=render.timings.get("render", 0.0),
+        )
+
+    db: Session = SessionLocal()
+    try:
+        job = db.query(AudioJob).filter(AudioJob.id == render.id).first()
         job.status = "completed"
-        job.result_s3_key = key
+        job.result_s3_key = render.result_key
+        job.error = None
         job.updated_at = datetime.utcnow()
         db.commit()
-    except Exception as exc:
-        if job:
-            job.status = "failed"
-            job.error = str(exc)
-            job.updated_at = datetime.utcnow()
-            db.commit()
-        raise
+        events.publish(job.id, "completed", stage="done", progress=1.0)
+
+        _complete_followers(db, job)
+    finally:
+        db.close()
+    checkpoints.clear(render.id)
+
+
+def is_transient(exc: BaseException) -> bool:
+    # Infrastructure hiccups worth another attempt: network, storage, database,
+    # Redis, or an ffmpeg process that failed or was killed.
+    if isinstance(exc, ClientError):
+        error = exc.response.get("Error", {})
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return status >= 500 or error.get("Code") in ("SlowDown", "Throttling", "RequestTimeout")
+    return isinstance(
+        exc,
+        (
+            OSError,
+            subprocess.SubprocessError,
+            BotoCoreError,
+            httpx.TransportError,
+            OperationalError,
+            redis.RedisError,
+        ),
+    )
+
+
+def will_retry(rq_job: Optional[Job], exc: BaseException) -> bool:
+    if rq_job is None or not rq_job.retries_left:
+        return False
+    if not is_transient(exc):
+        # Permanent errors skip the remaining retries and go straight to the failed registry.
+        rq_job.retries_left = 0
+        return False
+    return True
+
+
+def fail_render(job_id: str, exc: BaseException, retrying: bool = False):
+    db: Session = SessionLocal()
+    try:
+        job = db.query(AudioJob).filter(AudioJob.id == job_id).first()
+        if not job:
+            return
+        # A retry is already scheduled with backoff: the job goes back to queued
+        # and keeps its stage marker and checkpoints.
+        job.status = "queued" if retrying else "failed"
+        job.error = str(exc)
+        job.updated_at = datetime.utcnow()
+        db.commit()
+        events.publish(job.id, job.status, stage="retry" if retrying else None, error=job.error)
+        if not retrying:
+            _release_followers(db, job)
     finally:
         db.close()
+    if not retrying:
+        checkpoints.clear(job_id)
+
+
+def stop_render(job_id: str, exc: control.JobStopped | JobTimeoutException):
+    # Cancelled by the user or past a stage deadline: final, no retry, and the
+    # purchase goes back to the user.
+    db: Session = SessionLocal()
+    try:
+        job = db.query(AudioJob).filter(AudioJob.id == job_id).first()
+        if not job:
+            return
+        job.status = "cancelled" if isinstance(exc, control.JobCancelled) else "failed"
+        job.error = str(exc)
+        job.updated_at = datetime.utcnow()
+        refund_job_purchase(db, job.purchase_id, job.project_id, job.duration_sec)
+        db.commit()
+        events.publish(job.id, job.status, error=job.error)
+        _release_followers(db, job)
+    finally:
+        db.close()
+    control.clear_cancel(job_id)
+    checkpoints.clear(job_id)
+
+
+def process_audio_job(job_id: str):
+    # Sequential path for the forking and inline workers. Render and upload
+    # overlap here: encoded chunks go to the multipart upload while ffmpeg is
+    # still running, so they share one deadline. The pipeline worker runs the
+    # same stages on separate pools.
+    try:
+        # Inside the try: start_render commits "processing" before it can still
+        # fail, and the row must not be left there with RQ retrying unclassified.
+        render = start_render(job_id)
+        if render is None:
+            return
+        with control.stage(job_id, "tts"):
+            tts_stage(render)
+        if render.stage != checkpoints.STAGE_MIX:
+            started = time.monotonic()
+            with control.stage(job_id, "render", "upload"):
+                upload_stream(
+                    render.result_key,
+                    render_stream(
+                        voice_bytes=render.voice,
+                        music_track_id=render.music_track_id,
+                        target_duration_sec=render.duration_sec,
+                    ),
+                    content_type="audio/mpeg",
+                )
+            render.timings["render"] = time.monotonic() - started
+            _set_stage(render.id, checkpoints.STAGE_MIX)
+            render.stage = checkpoints.STAGE_MIX
+        complete_render(render)
+    except (control.JobStopped, JobTimeoutException) as exc:
+        # RQ's job timeout only trips if the stage deadlines did not; same outcome.
+        stop_render(job_id, exc)
+    except Exception as exc:
+        fail_render(job_id, exc, retrying=will_retry(get_current_job(), exc))
+        raise
@@ -0,0 +1,27 @@
+import os
+
+import fakeredis
+import pytest
+
+# config.Settings requires these; set before any worker module is imported.
+# Nothing here talks to a real database, Redis or S3.
+for name, value in {
+    "REDIS_URL": "redis://localhost:6379/0",
+    "DATABASE_URL": "sqlite://",
+    "S3_ENDPOINT": "http://localhost:9000",
+    "S3_ACCESS_KEY": "test",
+    "S3_SECRET_KEY": "test",
+    "S3_BUCKET": "test",
+    "S3_PUBLIC_URL": "http://localhost:9000/test",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    import redis_client
+
+    connection = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(redis_client, "_redis", connection)
+    monkeypatch.setattr(redis_client, "_queue_redis", connection)
+    return connection
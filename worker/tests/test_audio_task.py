@@ -0,0 +1,50 @@
+from rq.job import Job
+from rq.timeouts import JobTimeoutException
+
+import checkpoints
+import queues
+from config import settings
+from tasks import audio
+
+MB = 1024 * 1024
+
+
+def test_enqueue_render_outlasts_the_stage_deadlines(fake_redis):
+    queues.enqueue_render("job-1", queues.PAID)
+
+    deadlines = settings.stage_deadline_tts_sec + settings.stage_deadline_render_sec + settings.stage_deadline_upload_sec
+    assert Job.fetch("job-1", connection=fake_redis).timeout == deadlines + queues.JOB_TIMEOUT_MARGIN_SEC
+
+
+def test_rq_timeout_stops_the_job_instead_of_failing_it(monkeypatch):
+    stopped, failed = [], []
+
+    def overdue(job_id):
+        raise JobTimeoutException("Task exceeded maximum timeout value (660 seconds)")
+
+    monkeypatch.setattr(audio, "start_render", overdue)
+    monkeypatch.setattr(audio, "stop_render", lambda job_id, exc: stopped.append((job_id, type(exc))))
+    monkeypatch.setattr(audio, "fail_render", lambda *args, **kwargs: failed.append(args))
+
+    audio.process_audio_job("job-1")
+    assert stopped == [("job-1", JobTimeoutException)]
+    assert failed == []
+
+
+def test_pipeline_render_spools_the_mp3_for_upload(monkeypatch):
+    chunks = [bytes([index]) * MB for index in range(7)]
+    uploaded = []
+    monkeypatch.setattr(audio, "render_stream", lambda **kwargs: iter(chunks))
+    monkeypatch.setattr(audio, "upload_stream", lambda key, parts, content_type: uploaded.extend(parts))
+    monkeypatch.setattr(audio, "_set_stage", lambda job_id, stage: None)
+    monkeypatch.setattr(audio, "complete_render", lambda render: None)
+    render = audio.RenderJob(id="job-1", text="", voice_id="", music_track_id="calm_01", duration_sec=300, voice=b"v")
+
+    audio.render_stage(render)
+    # Past one multipart part the spool is on disk, not in memory.
+    assert render.output._rolled and render.voice is None
+
+    audio.upload_stage(render)
+    assert b"".join(uploaded) == b"".join(chunks)
+    assert max(len(part) for part in uploaded) <= MB
+    assert render.output is None and render.stage == checkpoints.STAGE_MIX
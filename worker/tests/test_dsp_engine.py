@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+import dsp_engine
+
+
+def _sine(dbfs: float, seconds: float = 10.0) -> np.ndarray:
+    t = np.arange(int(dsp_engine.SAMPLE_RATE * seconds)) / dsp_engine.SAMPLE_RATE
+    tone = (10.0 ** (dbfs / 20.0) * np.sin(2 * np.pi * 1000.0 * t)).astype(np.float32)
+    return np.repeat(tone[:, None], dsp_engine.CHANNELS, axis=1)
+
+
+def test_integrated_loudness_matches_the_reference_tone():
+    # EBU Tech 3341 case 1: a 1 kHz stereo sine at -23 dBFS reads -23 LUFS.
+    assert dsp_engine.integrated_loudness(_sine(-23.0)) == pytest.approx(-23.0, abs=0.1)
+    assert dsp_engine.integrated_loudness(_sine(-10.0)) == pytest.approx(-10.0, abs=0.1)
+
+
+def test_integrated_loudness_gates_quiet_passages_and_silence():
+    signal = _sine(-23.0)
+    signal[: len(signal) // 2] *= 10.0 ** (-40.0 / 20.0)
+    assert dsp_engine.integrated_loudness(signal) == pytest.approx(-23.0, abs=0.2)
+    assert dsp_engine.integrated_loudness(np.zeros((dsp_engine.SAMPLE_RATE * 2, 2), np.float32)) == -70.0
+    assert dsp_engine.integrated_loudness(_sine(-23.0, seconds=0.2)) == -70.0
+
+
+def test_normalize_loudness_reaches_the_target():
+    normalized = dsp_engine._normalize_loudness(_sine(-30.0), dsp_engine.TARGET_LUFS)
+    assert dsp_engine.integrated_loudness(normalized) == pytest.approx(dsp_engine.TARGET_LUFS, abs=0.05)
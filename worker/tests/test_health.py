@@ -0,0 +1,66 @@
+import time
+
+from providers import health
+
+
+def _state(provider="edge"):
+    return health.snapshots([provider])[provider]
+
+
+def _expire_open_period(fake_redis, provider="edge"):
+    fake_redis.hset(f"tts:health:{provider}", "opened_at", time.time() - health.settings.tts_breaker_open_sec - 1)
+
+
+def test_consecutive_failures_open_the_breaker(fake_redis):
+    for _ in range(health.settings.tts_breaker_failures - 1):
+        health.record("edge", 1.0, ok=False)
+    assert _state()["state"] == health.STATE_CLOSED
+    assert health.acquire("edge", _state())
+
+    health.record("edge", 1.0, ok=False)
+    assert _state()["state"] == health.STATE_OPEN
+    assert not health.acquire("edge", _state())
+
+
+def test_repeated_timeouts_open_the_breaker_despite_successes(fake_redis):
+    health.record("edge", 40.0, ok=False, timeout=True)
+    health.record("edge", 0.5, ok=True)
+    health.record("edge", 40.0, ok=False, timeout=True)
+    assert _state()["state"] == health.STATE_OPEN
+
+
+def test_half_open_lets_one_probe_through(fake_redis):
+    for _ in range(health.settings.tts_breaker_failures):
+        health.record("edge", 1.0, ok=False)
+    _expire_open_period(fake_redis)
+
+    snapshot = _state()
+    assert snapshot["state"] == health.STATE_HALF_OPEN
+    assert health.acquire("edge", snapshot)
+    assert not health.acquire("edge", snapshot)
+
+
+def test_probe_result_closes_or_reopens(fake_redis):
+    for _ in range(health.settings.tts_breaker_failures):
+        health.record("edge", 1.0, ok=False)
+    _expire_open_period(fake_redis)
+    health.record("edge", 1.0, ok=False)
+    assert _state()["state"] == health.STATE_OPEN
+
+    _expire_open_period(fake_redis)
+    assert health.acquire("edge", _state())
+    health.record("edge", 0.4, ok=True)
+    assert _state()["state"] == health.STATE_CLOSED
+    assert health.acquire("edge", _state())
+
+
+def test_closing_forgets_the_timeouts_that_opened_it(fake_redis):
+    for _ in range(health.settings.tts_breaker_timeouts):
+        health.record("edge", 40.0, ok=False, timeout=True)
+    _expire_open_period(fake_redis)
+    assert health.acquire("edge", _state())
+    health.record("edge", 0.4, ok=True)
+
+    health.record("edge", 40.0, ok=False, timeout=True)
+    assert _state()["state"] == health.STATE_CLOSED
+    assert _state()["samples"] == 2
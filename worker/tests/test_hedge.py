@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+from studio_shared import edge_client
+
+from providers import health, tts
+
+
+def test_hedges_stay_within_the_budget(fake_redis, monkeypatch):
+    monkeypatch.setattr(health.settings, "tts_hedge_budget", 0.1)
+    assert not health.try_hedge()
+
+    for _ in range(20):
+        health.count_hedge_eligible()
+    assert [health.try_hedge() for _ in range(3)] == [True, True, False]
+
+    # A refused hedge is not counted, so ten more requests buy exactly one more.
+    for _ in range(10):
+        health.count_hedge_eligible()
+    assert [health.try_hedge() for _ in range(2)] == [True, False]
+
+
+def test_hedge_cancels_the_losing_request(fake_redis, monkeypatch):
+    monkeypatch.setattr(tts.settings, "yandex_api_key", "key")
+    for _ in range(tts.settings.tts_hedge_min_samples):
+        health.record("edge", 0.05, ok=True)
+    for _ in range(10):
+        health.count_hedge_eligible()
+    abandoned = threading.Event()
+
+    def call_provider(provider, text, voice_id, cancelled=None):
+        if provider == "yandex":
+            return b"yandex-audio"
+        assert cancelled.wait(5)
+        abandoned.set()
+        return b""
+
+    monkeypatch.setattr(tts, "_call_provider", call_provider)
+    assert tts._synthesize_hedged("Я есть спокойствие.", None) == ("yandex", b"yandex-audio")
+    assert abandoned.wait(5)
+    # The abandoned edge request is not recorded against edge.
+    assert health.snapshots(["edge"])["edge"]["samples"] == tts.settings.tts_hedge_min_samples
+
+
+def test_edge_request_is_cancelled_in_flight(monkeypatch):
+    stopped = threading.Event()
+
+    async def collect(text, voice, rate, pitch):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            stopped.set()
+            raise
+
+    monkeypatch.setattr(edge_client, "_collect", collect)
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+    started = time.monotonic()
+    assert edge_client.synthesize("text", "voice", timeout=30, cancelled=cancelled) == b""
+    assert time.monotonic() - started < 5
+    assert stopped.wait(5)
@@ -0,0 +1,51 @@
+import pytest
+
+import mp3_frames
+
+FRAME_SEC = 1152 / 44100
+
+
+def test_silence_is_a_constant_bitrate_stream_of_whole_frames():
+    stream = mp3_frames.parse(mp3_frames.silence(1.0))
+    assert len(stream.frames) == 39
+    assert stream.bitrate_kbps == 32
+    assert stream.format == mp3_frames.FrameFormat(version=1, sample_rate=44100, mono=False)
+    assert 1.0 <= stream.duration_sec < 1.0 + FRAME_SEC
+    # Padding bits keep the average frame size at the exact 32 kbps value.
+    assert abs(len(stream.to_bytes()) - 39 * 144 * 32000 / 44100) < 1
+
+
+def test_parse_skips_tags_and_the_info_frame():
+    fmt = mp3_frames.FrameFormat(version=1, sample_rate=44100, mono=False)
+    info = bytearray(mp3_frames.silent_frames(fmt, 32, 1)[0])
+    info[36:40] = b"Info"
+    id3v2 = b"ID3\x04\x00\x00\x00\x00\x00\x14" + bytes(20)
+    id3v1 = b"TAG" + bytes(125)
+    audio = mp3_frames.silence(0.5)
+
+    stream = mp3_frames.parse(id3v2 + bytes(info) + audio + id3v1)
+    assert stream.to_bytes() == audio
+
+
+def test_parse_rejects_non_mp3_and_format_changes():
+    with pytest.raises(ValueError):
+        mp3_frames.parse(b"RIFF" + bytes(2000))
+    with pytest.raises(ValueError):
+        mp3_frames.parse(mp3_frames.silence(0.5) + mp3_frames.silence(0.5, mono=True))
+
+
+def test_fit_trims_and_pads_to_the_frame_boundary():
+    for source in (0.5, 2.0):
+        fitted = mp3_frames.parse(mp3_frames.fit(mp3_frames.silence(source), 1.0))
+        assert len(fitted.frames) == 39
+    assert mp3_frames.fit(mp3_frames.silence(1.0), 0) == b""
+
+
+def test_concat_inserts_the_pause_and_refuses_mixed_formats():
+    first, second = mp3_frames.silence(1.0), mp3_frames.silence(0.5)
+    joined = mp3_frames.parse(mp3_frames.concat([first, second], pause_sec=0.5))
+    assert len(joined.frames) == 39 + 20 + 20
+    assert joined.to_bytes().startswith(first) and joined.to_bytes().endswith(second)
+
+    assert mp3_frames.concat([first, mp3_frames.silence(1.0, sample_rate=48000)]) is None
+    assert mp3_frames.concat([]) is None
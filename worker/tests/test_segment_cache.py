@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+from studio_shared.segment_cache import SegmentCache
+
+import segment_cache
+
+
+@pytest.fixture
+def bucket():
+    return {}
+
+
+@pytest.fixture
+def make_cache(tmp_path, bucket, fake_redis):
+    def make(name="node", **overrides):
+        options = dict(
+            cache_dir=str(tmp_path / name),
+            max_mb=1,
+            idle_days=30,
+            sweep_sec=3600,
+            s3_prefix="tts-cache",
+            download=lambda key: bucket.get(key, b""),
+            upload=lambda key, data, content_type: bucket.__setitem__(key, data),
+            redis=lambda: fake_redis,
+        )
+        return SegmentCache(**{**options, **overrides})
+
+    return make
+
+
+def test_put_serves_this_node_and_the_others(make_cache, bucket):
+    first, second = make_cache("first"), make_cache("second")
+    first.put("ab12", b"audio")
+    assert list(bucket) == ["tts-cache/ab/ab12.mp3"]
+
+    assert first.get("ab12") == b"audio"
+    assert second.lookup(["missing", "ab12"]) == b"audio"
+    # The shared hit is now on the second node's disk too.
+    bucket.clear()
+    assert second.get("ab12") == b"audio"
+    assert second.get("missing") is None
+
+    stats = first.stats()
+    assert (stats["local_hits"], stats["shared_hits"], stats["misses"], stats["stores"]) == (2, 1, 1, 1)
+    assert stats["hit_ratio"] == 0.75
+
+
+def test_idle_entries_expire(make_cache):
+    cache = make_cache(s3_prefix="")
+    cache.put("cd34", b"audio")
+    stale = time.time() - 31 * 86400
+    os.utime(cache._path("cd34"), (stale, stale))
+    assert cache.get("cd34") is None
+    assert cache.sweep() == 1
+
+
+def test_sweep_evicts_least_recently_used_down_to_the_bound(make_cache):
+    cache = make_cache(s3_prefix="")
+    for index in range(5):
+        cache._put_local(f"{index:02d}ef", bytes(300 * 1024))
+        stamp = time.time() - 100 + index
+        os.utime(cache._path(f"{index:02d}ef"), (stamp, stamp))
+
+    # 1500 KiB against a 1 MiB bound: evicting the two oldest gets under 90%.
+    assert cache.sweep() == 2
+    assert [cache.get(f"{index:02d}ef") is not None for index in range(5)] == [False, False, True, True, True]
+
+
+def test_split_lines_drops_blank_lines():
+    assert segment_cache.split_lines("  Я есть спокойствие. \n\n\tЯ имею фокус.\n") == [
+        "Я есть спокойствие.",
+        "Я имею фокус.",
+    ]
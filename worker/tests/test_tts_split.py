@@ -0,0 +1,23 @@
+from providers.tts import _pack, split_text
+
+TEXT = "Я есть спокойствие. Я имею фокус!\nЯ доверяю жизни."
+
+
+def test_split_text_keeps_short_text_whole():
+    assert split_text(TEXT, 1000) == [TEXT]
+    assert split_text("\n\n  \n", 10) == []
+
+
+def test_split_text_breaks_on_sentences_in_reading_order():
+    assert split_text(TEXT, 40) == ["Я есть спокойствие. Я имею фокус!", "Я доверяю жизни."]
+
+
+def test_split_text_falls_back_to_clauses_then_characters():
+    chunks = split_text("Один, два, три, четыре, пять, шесть, семь, восемь", 20)
+    assert chunks == ["Один, два, три,", "четыре, пять, шесть,", "семь, восемь"]
+    assert split_text("а" * 25, 10) == ["а" * 10, "а" * 10, "а" * 5]
+
+
+def test_pack_keeps_line_breaks_between_pieces():
+    assert _pack(["a\n", "b", "c\n", "d"], 100) == ["a\nb c\nd"]
+    assert _pack(["aaa", "bbb", "ccc"], 7) == ["aaa bbb", "ccc"]
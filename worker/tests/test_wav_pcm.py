@@ -0,0 +1,44 @@
+import struct
+
+import pytest
+
+import wav_pcm
+
+
+def _wav(pcm: bytes, sample_rate=22050, channels=1, width=2) -> bytes:
+    return wav_pcm.WavAudio(sample_rate, channels, width, pcm).to_bytes()
+
+
+def test_parse_reads_espeak_streaming_headers():
+    # espeak --stdout leaves the RIFF and data sizes at 0xFFFFFFFF.
+    data = bytearray(_wav(b"\x01\x00" * 22050))
+    struct.pack_into("<I", data, 4, 0xFFFFFFFF)
+    struct.pack_into("<I", data, 40, 0xFFFFFFFF)
+    audio = wav_pcm.parse(bytes(data))
+    assert (audio.sample_rate, audio.channels, audio.sample_width) == (22050, 1, 2)
+    assert audio.duration_sec == 1.0
+
+
+def test_parse_skips_unknown_chunks_and_rejects_other_formats():
+    plain = _wav(b"\x00\x00" * 100)
+    with_list = plain[:36] + b"LIST" + struct.pack("<I", 3) + b"abc\x00" + plain[36:]
+    assert wav_pcm.parse(with_list).frames == 100
+
+    with pytest.raises(ValueError):
+        wav_pcm.parse(b"ID3" + bytes(100))
+    float_format = bytearray(plain)
+    struct.pack_into("<H", float_format, 20, 3)
+    with pytest.raises(ValueError):
+        wav_pcm.parse(bytes(float_format))
+
+
+def test_concat_inserts_silence_and_refuses_mixed_formats():
+    first, second = _wav(b"\x01\x00" * 100), _wav(b"\x02\x00" * 50)
+    joined = wav_pcm.parse(wav_pcm.concat([first, second], pause_sec=0.01))
+    assert joined.pcm == b"\x01\x00" * 100 + b"\x00\x00" * 220 + b"\x02\x00" * 50
+
+    unsigned = wav_pcm.parse(wav_pcm.concat([_wav(b"\x90", width=1)] * 2, pause_sec=0.001))
+    assert unsigned.pcm == b"\x90" + b"\x80" * 22 + b"\x90"
+
+    assert wav_pcm.concat([first, _wav(b"\x00\x00" * 10, sample_rate=44100)]) is None
+    assert wav_pcm.concat([]) is None
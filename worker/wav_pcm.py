@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+# RIFF/WAVE PCM helpers for the espeak path. espeak --stdout writes a streaming
+# header whose RIFF and data sizes are 0 or 0xFFFFFFFF, so sizes that do not
+# fit the buffer are read as "to the end". Only integer PCM is handled; parse()
+# raises ValueError for anything else.
+
+_FORMAT_PCM = 1
+_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass
+class WavAudio:
+    sample_rate: int
+    channels: int
+    sample_width: int
+    pcm: bytes
+
+    @property
+    def frame_size(self) -> int:
+        return self.channels * self.sample_width
+
+    @property
+    def frames(self) -> int:
+        return len(self.pcm) // self.frame_size
+
+    @property
+    def duration_sec(self) -> float:
+        return self.frames / self.sample_rate
+
+    def same_format(self, other: "WavAudio") -> bool:
+        return (self.sample_rate, self.channels, self.sample_width) == (
+            other.sample_rate,
+            other.channels,
+            other.sample_width,
+        )
+
+    def to_bytes(self) -> bytes:
+        pcm = self.pcm[: self.frames * self.frame_size]
+        header = struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF",
+            36 + len(pcm),
+            b"WAVE",
+            b"fmt ",
+            16,
+            _FORMAT_PCM,
+            self.channels,
+            self.sample_rate,
+            self.sample_rate * self.frame_size,
+            self.frame_size,
+            self.sample_width * 8,
+            b"data",
+            len(pcm),
+        )
+        return header + pcm
+
+
+def is_wav(data: bytes) -> bool:
+    return len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+
+def parse(data: bytes) -> WavAudio:
+    if not is_wav(data):
+        raise ValueError("Not a RIFF/WAVE stream")
+
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset : offset + 4]
+        size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if size < 16 or body + 16 > len(data):
+                raise ValueError("Truncated fmt chunk")
+            tag, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if tag == _FORMAT_EXTENSIBLE and size >= 40:
+                tag = struct.unpack_from("<H", data, body + 24)[0]
+            if tag != _FORMAT_PCM or channels < 1 or sample_rate < 1 or bits not in (8, 16, 24, 32):
+                raise ValueError("Unsupported WAV sample format")
+            fmt = (sample_rate, channels, bits // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            end = len(data) if size in (0, 0xFFFFFFFF) or body + size > len(data) else body + size
+            return WavAudio(sample_rate=fmt[0], channels=fmt[1], sample_width=fmt[2], pcm=data[body:end])
+        offset = body + size + (size & 1)
+
+    raise ValueError("No WAV data chunk found")
+
+
+def duration_sec(data: bytes) -> float:
+    return parse(data).duration_sec
+
+
+def concat(segments: list[bytes], pause_sec: float = 0.0) -> Optional[bytes]:
+    # None when the segments do not share sample rate, channel count and width.
+    clips = [parse(segment) for segment in segments]
+    if not clips:
+        return None
+    first = clips[0]
+    if any(not clip.same_format(first) for clip in clips):
+        return None
+
+    # 8-bit WAV is unsigned, so its silence is 0x80 rather than zero.
+    silence_byte = b"\x80" if first.sample_width == 1 else b"\x00"
+    pause = silence_byte * (int(round(max(0.0, pause_sec) * first.sample_rate)) * first.frame_size)
+    parts = []
+    for index, clip in enumerate(clips):
+        if index:
+            parts.append(pause)
+        parts.append(clip.pcm[: clip.frames * clip.frame_size])
+    return WavAudio(first.sample_rate, first.channels, first.sample_width, b"".join(parts)).to_bytes()